@@ -0,0 +1,270 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from itertools import combinations
+
+# Benchmarks never open a window, frames are drawn on the dummy video driver
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+from constants import *
+from parser import parse_obj
+from point_data import Vec3
+from models import BaseModel
+from profiler import FrameProfiler
+from geometry import Area, AreaError
+from metrics import mesh_metrics
+
+SEED = 0
+
+
+# Synthetic meshes, (vertices, zero based faces) of roughly `count` vertices inside the unit cube
+def grid_mesh(count: int):
+    # Side x side vertices joined by quads over a gentle height field
+    side = max(int(round(np.sqrt(count))), 2)
+    x, y = np.meshgrid(np.linspace(-1, 1, side), np.linspace(-1, 1, side))
+    vertices = np.column_stack((x.ravel(), y.ravel(), np.sin(3 * x.ravel()) * np.cos(3 * y.ravel()) / 4))
+    
+    corner = (np.arange(side - 1)[:, None] * side + np.arange(side - 1)[None, :]).ravel()
+    
+    return vertices, np.column_stack((corner, corner + 1, corner + side + 1, corner + side))
+
+def cube_mesh(count: int):
+    # Every side is its own grid of quads wound outwards, the seams are not welded
+    side = max(int(round(np.sqrt(count / 6))), 2)
+    u, v = (axis.ravel() for axis in np.meshgrid(np.linspace(-1, 1, side), np.linspace(-1, 1, side)))
+    
+    corner = (np.arange(side - 1)[:, None] * side + np.arange(side - 1)[None, :]).ravel()
+    quads = np.column_stack((corner, corner + 1, corner + side + 1, corner + side))
+    
+    vertices, faces = [], []
+    for axis in range(3):
+        for sign in (1, -1):
+            side_vertices = np.empty((side * side, 3))
+            side_vertices[:, axis] = sign
+            side_vertices[:, (axis + 1) % 3] = u
+            side_vertices[:, (axis + 2) % 3] = v
+            
+            faces.append((quads if sign > 0 else quads[:, ::-1]) + len(vertices) * side * side)
+            vertices.append(side_vertices)
+    
+    return np.concatenate(vertices), np.concatenate(faces)
+
+def sphere_mesh(count: int):
+    # Subdivided cube pushed out onto the unit sphere
+    vertices, faces = cube_mesh(count)
+    
+    return vertices / np.linalg.norm(vertices, axis=1)[:, None], faces
+
+def soup_mesh(count: int):
+    # Unconnected random triangles, the worst case for caches and culling. They shrink as their number
+    # grows so the covered area, and with it the overdraw, stays about the same
+    generator = np.random.default_rng(SEED)
+    count = max(count // 3, 1)
+    
+    centres = generator.uniform(-1, 1, (count, 1, 3))
+    vertices = (centres + generator.uniform(-1, 1, (count, 3, 3)) * 2 / np.sqrt(count)).reshape(-1, 3)
+    
+    return vertices, np.arange(len(vertices)).reshape(-1, 3)
+
+MESHES = {"grid": grid_mesh, "cube": cube_mesh, "sphere": sphere_mesh, "soup": soup_mesh}
+
+def write_obj(path: str, vertices: np.ndarray, faces: np.ndarray):
+    # Written in bulk to keep generation fast
+    with open(path, "w") as file:
+        np.savetxt(file, vertices, fmt="v %.6f %.6f %.6f")
+        np.savetxt(file, faces + 1, fmt="f" + " %d" * faces.shape[1])
+
+# Measurements
+def time_call(fn, repeats: int):
+    best = float("inf")
+    
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    
+    return best
+
+def peak_memory(fn):
+    # Peak bytes allocated by fn, numpy buffers included
+    tracemalloc.start()
+    
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def flag_combinations(names: list[str]):
+    for size in range(1, len(names) + 1):
+        for combination in combinations(names, size):
+            yield "|".join(combination), sum(DisplayFlags[name].value for name in combination)
+
+def benchmark_frames(screen: pygame.Surface, data: PackedModelData, display_flag: int, frames: int):
+    # The model turns a little every frame so no projection is reused, stage timings are per frame medians in seconds
+    model = BaseModel(screen, data, Vec3(0, 0, 3))
+    model.profiler = profiler = FrameProfiler(window=frames)
+    
+    # Triangulation and edge extraction happen once per mesh, not per frame
+    model.draw(display_flag)
+    profiler.end_frame()
+    profiler.frames.clear()
+    
+    for _ in range(frames):
+        model.angle.xz += 360 / frames
+        screen.fill("black")
+        
+        with profiler.stage("draw"):
+            model.draw(display_flag)
+        profiler.end_frame()
+    
+    # "frame" also covers the fill and the loop itself
+    names = sorted({name for frame in profiler.frames for name in frame} - {"frame"})
+    
+    return {name: float(np.median([frame.get(name, 0) for frame in profiler.frames])) for name in names}
+
+def benchmark_suite(meshes: list[str], sizes: list[int], flags: list[str], frames: int, repeats: int):
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for mesh in meshes:
+            for size in sizes:
+                path = os.path.join(directory, f"{mesh}_{size}.obj")
+                write_obj(path, *MESHES[mesh](size))
+                
+                data = parse_obj(path, use_cache=False)
+                result = {
+                    "mesh": mesh,
+                    "size": size,
+                    "vertices": len(data.v),
+                    "faces": len(data.offsets) - 1,
+                    "file_bytes": os.path.getsize(path),
+                    "parse_seconds": time_call(lambda: parse_obj(path, use_cache=False), repeats),
+                    "parse_peak_bytes": peak_memory(lambda: parse_obj(path, use_cache=False)),
+                    "frames": {name: benchmark_frames(screen, data, flag, frames) for name, flag in flag_combinations(flags)},
+                }
+                os.remove(path)
+                
+                print(
+                    f"{mesh:>6} {result['vertices']:>10} vertices  parse {result['parse_seconds']:7.3f}s  "
+                    f"peak {result['parse_peak_bytes'] / 2**20:8.1f} MiB  "
+                    + "  ".join(f"{name} {times['draw'] * 1000:.1f}ms" for name, times in result["frames"].items())
+                )
+                results.append(result)
+    
+    pygame.quit()
+    
+    return results
+
+def benchmark_workers(sizes: list[int], workers: int, repeats: int):
+    # Sequential against parallel parsing of the same grid
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            path = os.path.join(directory, f"grid_{size}.obj")
+            write_obj(path, *grid_mesh(size))
+            
+            sequential = time_call(lambda: parse_obj(path, use_cache=False), repeats)
+            parallel = time_call(lambda: parse_obj(path, use_cache=False, workers=workers), repeats)
+            
+            print(
+                f"{size:>10} vertices  {os.path.getsize(path) / 2**20:8.1f} MiB  "
+                f"sequential {sequential:7.3f}s  {workers} workers {parallel:7.3f}s  "
+                f"speedup {sequential / parallel:5.2f}x"
+            )
+
+def regular_polygons(count: int, sides: int):
+    # Regular polygons of random size in random planes, with their exact areas
+    generator = np.random.default_rng(SEED)
+    
+    radii = generator.uniform(0.5, 2, count)
+    angles = 2 * np.pi * np.arange(sides) / sides + generator.uniform(0, 2 * np.pi, (count, 1))
+    flat = np.stack((np.cos(angles) * radii[:, None], np.sin(angles) * radii[:, None], np.zeros_like(angles)), axis=2)
+    
+    rotations, _ = np.linalg.qr(generator.normal(size=(count, 3, 3)))
+    vertices = flat @ rotations.transpose(0, 2, 1) + generator.uniform(-10, 10, (count, 1, 3))
+    
+    return vertices, sides / 2 * radii**2 * np.sin(2 * np.pi / sides)
+
+def _polygon_area(lengths: list[float]):
+    # Area gives up on some shapes, those count as failures rather than stopping the comparison
+    try:
+        return Area.area_of_polygon(*lengths)
+    except (ValueError, AreaError):
+        return np.nan
+
+def benchmark_metrics(count: int, sides: list[int], repeats: int):
+    # Area.area_of_polygon from side lengths against mesh_metrics from the vertices, on the same polygons
+    for side_count in sides:
+        vertices, exact = regular_polygons(count, side_count)
+        lengths = np.linalg.norm(vertices - np.roll(vertices, -1, axis=1), axis=2).tolist()
+        data = PackedModelData(vertices.reshape(-1, 3), np.arange(count * side_count), np.arange(0, count * side_count + 1, side_count))
+        
+        area = np.array([_polygon_area(sides) for sides in lengths])
+        metrics = mesh_metrics(data).areas
+        
+        area_time = time_call(lambda: [_polygon_area(sides) for sides in lengths], repeats) / count
+        metrics_time = time_call(lambda: mesh_metrics(data).areas, repeats) / count
+        
+        print(
+            f"{side_count:>2} sides  "
+            f"Area {area_time * 1e6:8.3f}us/face max error {np.nanmax(np.abs(area - exact) / exact):9.2e} "
+            f"failed {np.isnan(area).sum():>6}  "
+            f"mesh_metrics {metrics_time * 1e6:8.3f}us/face max error {np.max(np.abs(metrics - exact) / exact):9.2e}  "
+            f"speedup {area_time / metrics_time:7.1f}x"
+        )
+
+def environment():
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pygame": pygame.version.ver,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "screen": [WIDTH, HEIGHT],
+        "seed": SEED,
+    }
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Rendering and parsing benchmarks, run without a display")
+    commands = argparser.add_subparsers(dest="command", required=True)
+    
+    suite = commands.add_parser("suite", help="Parse time, peak memory and frame times of synthetic meshes")
+    suite.add_argument("--meshes", nargs="+", choices=list(MESHES), default=["cube", "sphere", "soup"])
+    suite.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000, 10_000_000])
+    suite.add_argument("--flags", nargs="+", choices=[flag.name for flag in DisplayFlags], default=[flag.name for flag in DisplayFlags], help="Every combination of these is timed")
+    suite.add_argument("--frames", type=int, default=10)
+    suite.add_argument("--repeats", type=int, default=3)
+    suite.add_argument("--output", default="benchmark.json")
+    
+    workers = commands.add_parser("workers", help="Compare sequential and parallel OBJ parsing")
+    workers.add_argument("--sizes", type=int, nargs="+", default=[10_000, 250_000, 1_000_000, 4_000_000])
+    workers.add_argument("--workers", type=int, default=os.cpu_count())
+    workers.add_argument("--repeats", type=int, default=3)
+    
+    metrics = commands.add_parser("metrics", help="Speed and accuracy of polygon areas against geometry.Area")
+    metrics.add_argument("--count", type=int, default=100_000)
+    metrics.add_argument("--sides", type=int, nargs="+", default=[3, 4, 5, 6, 8])
+    metrics.add_argument("--repeats", type=int, default=3)
+    
+    args = argparser.parse_args()
+    
+    if args.command == "suite":
+        results = benchmark_suite(args.meshes, args.sizes, args.flags, args.frames, args.repeats)
+        
+        with open(args.output, "w") as file:
+            json.dump({"environment": environment(), "arguments": vars(args), "results": results}, file, indent=2)
+    elif args.command == "workers":
+        benchmark_workers(args.sizes, args.workers, args.repeats)
+    else:
+        benchmark_metrics(args.count, args.sides, args.repeats)
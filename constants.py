@@ -1,11 +1,39 @@
-from dataclasses import dataclass
+from dataclasses import MISSING, dataclass, fields
 from enum import Enum
+import os
+
+import numpy as np
 
 Number = int | float
 
 WIDTH = 500
 HEIGHT = 500
 POINT_SIZE = 4
+LABEL_CACHE_SIZE = 4096
+
+NEAR_PLANE = 0.01
+FACE_COLOUR = (200, 200, 200)
+AMBIENT_LIGHT = 0.2
+LIGHT_DIRECTION = np.array((-0.3, 0.5, -1)) / np.linalg.norm((-0.3, 0.5, -1))
+
+LOD_LEVELS = 6
+LOD_MIN_FACES = 64
+LOD_PIXEL_ERROR = 1.0
+LOD_MAX_PIXEL_ERROR = 16.0
+
+SIMULATION_RATE = 120
+MAX_FRAME_TIME = 0.25
+
+PROFILE_WINDOW = 120
+PROFILE_PERCENTILES = (50, 95, 99)
+PROFILE_STAGES = ("update", "wait", "transform", "projection", "faces", "wireframe", "points", "labels", "picking", "display", "frame")
+
+PICK_CELL_SIZE = 8
+PICK_RADIUS = 8
+# A vertex this much (relative to 1 / z) behind the depth buffer still counts as seen
+PICK_DEPTH_TOLERANCE = 0.02
+
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "py-3d")
 
 class DisplayFlags(Enum):
     VERTEX   =  0b0001
@@ -17,3 +45,94 @@ class DisplayFlags(Enum):
 class ModelData:
     v: list[tuple[Number, Number, Number]]
     f: list[tuple[int, int, int]]
+
+@dataclass
+class FaceGroups:
+    # Group i covers faces starts[i]:starts[i + 1], the last group runs to the end of the mesh
+    names: list[str]
+    starts: np.ndarray
+    
+    def ranges(self, face_count: int):
+        ends = [*self.starts[1:].tolist(), face_count]
+        
+        return list(zip(self.names, self.starts.tolist(), ends))
+
+@dataclass
+class PackedModelData:
+    # Face i is indices[offsets[i]:offsets[i + 1]], which keeps mixed polygon sizes in two flat arrays
+    v: np.ndarray
+    indices: np.ndarray
+    offsets: np.ndarray
+    
+    # Optional OBJ attributes, texture_indices and normal_indices run parallel to indices with -1 where a corner has none
+    vt: np.ndarray | None = None
+    vn: np.ndarray | None = None
+    texture_indices: np.ndarray | None = None
+    normal_indices: np.ndarray | None = None
+    
+    objects: FaceGroups | None = None
+    groups: FaceGroups | None = None
+    materials: FaceGroups | None = None
+    
+    @property
+    def f(self):
+        indices = self.indices.tolist()
+        offsets = self.offsets.tolist()
+        
+        return [indices[start:end] for start, end in zip(offsets, offsets[1:])]
+    
+    @property
+    def face_sizes(self):
+        return np.diff(self.offsets)
+    
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, 3), dtype=np.float32), np.zeros(0, dtype=np.int32), np.zeros(1, dtype=np.int64))
+    
+    @classmethod
+    def pack(cls, data: "ModelData | PackedModelData"):
+        if isinstance(data, PackedModelData):
+            return data
+        
+        offsets = np.zeros(len(data.f) + 1, dtype=np.int64)
+        np.cumsum([len(face) for face in data.f], out=offsets[1:])
+        
+        indices = np.fromiter((index for face in data.f for index in face), dtype=np.int32, count=offsets[-1])
+        
+        return cls(np.asarray(data.v, dtype=np.float32).reshape(-1, 3), indices, offsets)
+    
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        
+        for field in fields(self):
+            value = getattr(self, field.name)
+            
+            if isinstance(value, FaceGroups):
+                np.save(os.path.join(directory, f"{field.name}_names.npy"), np.array(value.names, dtype=str))
+                np.save(os.path.join(directory, f"{field.name}_starts.npy"), value.starts)
+            elif value is not None:
+                np.save(os.path.join(directory, f"{field.name}.npy"), value)
+    
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True):
+        # Memory-mapped arrays are read-only and shared through the page cache by every process that maps them
+        mmap_mode = "r" if mmap else None
+        
+        def load_field(name: str):
+            path = os.path.join(directory, f"{name}.npy")
+            
+            if os.path.exists(path):
+                return np.load(path, mmap_mode=mmap_mode)
+            if os.path.exists(os.path.join(directory, f"{name}_names.npy")):
+                return FaceGroups(load_field(f"{name}_names").tolist(), load_field(f"{name}_starts"))
+            
+            return None
+        
+        values = {field.name: load_field(field.name) for field in fields(cls)}
+        
+        # Only the optional attributes may be absent, anything else means the directory is incomplete
+        missing = [field.name for field in fields(cls) if field.default is MISSING and values[field.name] is None]
+        if missing:
+            raise FileNotFoundError(f"{directory} has no {', '.join(missing)}")
+        
+        return cls(**values)
@@ -0,0 +1,131 @@
+import numpy as np
+
+from constants import NEAR_PLANE
+
+# Corners clip_triangles puts on the near plane can land a rounding error behind it, triangles are only
+# dropped when they reach behind this
+CLIPPED_NEAR_PLANE = NEAR_PLANE * (1 - 1e-6)
+
+
+def _lerp_to_near_plane(start: np.ndarray, end: np.ndarray):
+    # Point where the segment start -> end crosses z = NEAR_PLANE, clip coordinates are linear in view space
+    t = (NEAR_PLANE - start[:, 2]) / (end[:, 2] - start[:, 2])
+    
+    return start + t[:, None] * (end - start)
+
+def _divide(clip: np.ndarray):
+    return clip[:, :2] / clip[:, 2:]
+
+def visible_points(points: np.ndarray, depth: np.ndarray, width: int, height: int, margin: float = 0):
+    return (
+        (depth > NEAR_PLANE)
+        & (points[:, 0] >= -margin) & (points[:, 0] <= width + margin)
+        & (points[:, 1] >= -margin) & (points[:, 1] <= height + margin)
+    )
+
+def clip_edges(clip: np.ndarray, edges: np.ndarray, width: int, height: int):
+    # Screen space end points of the edges that can be seen, cut at the near plane where they cross it
+    start, end = clip[edges[:, 0]], clip[edges[:, 1]]
+    
+    in_front = (start[:, 2] > NEAR_PLANE) | (end[:, 2] > NEAR_PLANE)
+    start, end = start[in_front], end[in_front]
+    
+    start_behind = start[:, 2] <= NEAR_PLANE
+    end_behind = end[:, 2] <= NEAR_PLANE
+    
+    start[start_behind] = _lerp_to_near_plane(start[start_behind], end[start_behind])
+    end[end_behind] = _lerp_to_near_plane(end[end_behind], start[end_behind])
+    
+    return clip_to_screen(_divide(start), _divide(end), width, height)
+
+def clip_to_screen(start: np.ndarray, end: np.ndarray, width: int, height: int):
+    # Liang-Barsky clipping of every segment against the pixel area, segments that miss it are dropped
+    delta = end - start
+    
+    p = np.stack((-delta[:, 0], delta[:, 0], -delta[:, 1], delta[:, 1]))
+    q = np.stack((start[:, 0], width - 1 - start[:, 0], start[:, 1], height - 1 - start[:, 1]))
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = q / p
+    
+    t_start = np.max(np.where(p < 0, ratios, 0), axis=0)
+    t_end = np.min(np.where(p > 0, ratios, 1), axis=0)
+    
+    kept = (t_start <= t_end) & ~np.any((p == 0) & (q < 0), axis=0)
+    
+    return start[kept] + t_start[kept, None] * delta[kept], start[kept] + t_end[kept, None] * delta[kept]
+
+def clip_triangles(clip: np.ndarray, triangles: np.ndarray):
+    # Cuts triangles at the near plane, new corners are appended to the clip coordinates.
+    # Returns the extended coordinates, the resulting triangles and the input triangle each one came from
+    behind = clip[:, 2][triangles] <= NEAR_PLANE
+    behind_count = behind.sum(axis=1)
+    
+    whole = np.flatnonzero(behind_count == 0)
+    one_behind = np.flatnonzero(behind_count == 1)
+    two_behind = np.flatnonzero(behind_count == 2)
+    
+    # Rotate the corners (keeping the winding) so that the odd one out comes first
+    def rotated(selection: np.ndarray, first: np.ndarray):
+        order = (first[:, None] + np.arange(3)) % 3
+        
+        return np.take_along_axis(triangles[selection], order, axis=1)
+    
+    one = rotated(one_behind, np.argmax(behind[one_behind], axis=1))
+    two = rotated(two_behind, np.argmin(behind[two_behind], axis=1))
+    
+    new_corners = [
+        _lerp_to_near_plane(clip[one[:, 0]], clip[one[:, 1]]),
+        _lerp_to_near_plane(clip[one[:, 0]], clip[one[:, 2]]),
+        _lerp_to_near_plane(clip[two[:, 1]], clip[two[:, 0]]),
+        _lerp_to_near_plane(clip[two[:, 2]], clip[two[:, 0]]),
+    ]
+    
+    first_new = len(clip)
+    one_ab = first_new + np.arange(len(one))
+    one_ac = one_ab + len(one)
+    two_ab = first_new + 2 * len(one) + np.arange(len(two))
+    two_ac = two_ab + len(two)
+    
+    extended = np.concatenate((clip, *new_corners))
+    
+    clipped = np.concatenate((
+        triangles[whole],
+        np.column_stack((one_ab, one[:, 1], one[:, 2])),
+        np.column_stack((one_ab, one[:, 2], one_ac)),
+        np.column_stack((two[:, 0], two_ab, two_ac)),
+    )).astype(np.int64)
+    
+    source = np.concatenate((whole, one_behind, one_behind, two_behind))
+    
+    return extended, clipped, source
+
+def cull_triangles(points: np.ndarray, triangles: np.ndarray, width: int, height: int, back_faces: bool):
+    # The projection mirrors right-handed OBJ data, so triangles wound counter clockwise (OBJ's front faces)
+    # end up with a positive signed area on the y-down screen
+    (x0, x1, x2), (y0, y1, y2) = points[triangles].transpose(2, 1, 0)
+    
+    area = (x1 - x0) * (y2 - y0) - (x2 - x0) * (y1 - y0)
+    
+    off_screen = (
+        ((x0 < 0) & (x1 < 0) & (x2 < 0)) | ((x0 > width) & (x1 > width) & (x2 > width))
+        | ((y0 < 0) & (y1 < 0) & (y2 < 0)) | ((y0 > height) & (y1 > height) & (y2 > height))
+    )
+    
+    visible = ~off_screen & (area != 0)
+    
+    if back_faces:
+        visible &= area > 0
+    
+    return np.flatnonzero(visible)
+
+def boxes_outside_frustum(low: np.ndarray, high: np.ndarray, margin: float = 0):
+    # View space boxes entirely behind the near plane or beyond one side of the view, margin widens the sides
+    # as a fraction of the view. Each side plane is tested at the box corner furthest inside it
+    slope = 1 + margin
+    
+    return (
+        (high[:, 2] <= NEAR_PLANE)
+        | (low[:, 0] - slope * high[:, 2] > 0) | (-high[:, 0] - slope * high[:, 2] > 0)
+        | (low[:, 1] - slope * high[:, 2] > 0) | (-high[:, 1] - slope * high[:, 2] > 0)
+    )
@@ -0,0 +1,90 @@
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+import pygame
+
+from constants import LABEL_CACHE_SIZE
+
+
+@lru_cache(maxsize=None)
+def system_font(name: str, size: int):
+    # SysFont searches the system font list and loads the file on every call, one font per name and size is shared instead
+    if not pygame.font.get_init():
+        pygame.font.init()
+    
+    return pygame.font.SysFont(name, size)
+
+class LabelRenderer:
+    # Labels are assembled from cached glyph surfaces instead of calling Font.render every frame,
+    # and the assembled labels are kept in a bounded LRU
+    def __init__(self, font: pygame.font.Font, colour: str | tuple[int, int, int], cache_size: int = LABEL_CACHE_SIZE):
+        self.font = font
+        self.colour = colour
+        self.cache_size = cache_size
+        
+        self._glyphs: dict[str, pygame.Surface] = {}
+        self._labels: OrderedDict[str, pygame.Surface] = OrderedDict()
+    
+    def _glyph(self, character: str):
+        glyph = self._glyphs.get(character)
+        
+        if glyph is None:
+            glyph = self._glyphs[character] = self.font.render(character, True, self.colour)
+        
+        return glyph
+    
+    def render(self, text: str):
+        label = self._labels.get(text)
+        
+        if label is not None:
+            self._labels.move_to_end(text)
+            return label
+        
+        glyphs = [self._glyph(character) for character in text]
+        label = pygame.Surface((sum(glyph.get_width() for glyph in glyphs), self.font.get_linesize()), pygame.SRCALPHA)
+        
+        x = 0
+        for glyph in glyphs:
+            label.blit(glyph, (x, 0))
+            x += glyph.get_width()
+        
+        self._labels[text] = label
+        
+        if len(self._labels) > self.cache_size:
+            self._labels.popitem(last=False)
+        
+        return label
+    
+    def draw(self, surface: pygame.Surface, labels: np.ndarray, anchors: np.ndarray, priority: np.ndarray | None = None):
+        # Draws str(label) with its bottom centre at each anchor. Labels are bucketed into a grid of label sized
+        # cells and only the first one of every cell (lowest priority value) is drawn, which keeps them from piling up
+        if not len(labels):
+            return
+        
+        width, height = surface.get_size()
+        
+        cell_width = self._glyph("0").get_width() * len(str(int(labels.max())))
+        cell_height = self.font.get_linesize()
+        
+        on_screen = (
+            (anchors[:, 0] >= -cell_width / 2) & (anchors[:, 0] <= width + cell_width / 2)
+            & (anchors[:, 1] >= 0) & (anchors[:, 1] <= height + cell_height)
+        )
+        
+        order = np.flatnonzero(on_screen)
+        
+        if priority is not None:
+            order = order[np.argsort(priority[order], kind="stable")]
+        
+        cells = np.floor(anchors[order] / (cell_width, cell_height)).astype(np.int64)
+        _, first = np.unique(cells[:, 0] * (height // cell_height + 2) + cells[:, 1], return_index=True)
+        
+        kept = order[np.sort(first)]
+        
+        blits = []
+        for label, (x, y) in zip(labels[kept].tolist(), anchors[kept].tolist()):
+            label_surface = self.render(str(label))
+            blits.append((label_surface, (x - label_surface.get_width() / 2, y - label_surface.get_height())))
+        
+        surface.blits(blits, doreturn=False)
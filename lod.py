@@ -0,0 +1,135 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from constants import PackedModelData, LOD_LEVELS, LOD_MIN_FACES, LOD_PIXEL_ERROR, LOD_MAX_PIXEL_ERROR
+from mesh import triangulate, triangle_normals
+
+
+@dataclass
+class LodLevel:
+    data: PackedModelData
+    # Largest distance (model units) a vertex may have moved, the size of the clustering cell
+    error: float
+
+def _cluster_positions(vertices: np.ndarray, triangles: np.ndarray, clusters: np.ndarray, cluster_count: int):
+    # Every cluster collapses to the point minimising the area weighted squared distance to the planes of the
+    # triangles around it (Garland-Heckbert quadrics), pulled slightly towards the cluster mean so flat or
+    # sparse clusters stay well defined
+    normals = triangle_normals(vertices, triangles)
+    areas = np.linalg.norm(normals, axis=1)
+    
+    units = np.divide(normals, areas[:, None], out=np.zeros_like(normals), where=areas[:, None] > 0)
+    distances = -(units * vertices[triangles[:, 0]]).sum(axis=1)
+    planes = np.column_stack((units, distances))
+    
+    corner_clusters = clusters[triangles].ravel()
+    
+    def accumulate(weights: np.ndarray):
+        return np.bincount(corner_clusters, weights=np.repeat(weights, 3), minlength=cluster_count)
+    
+    quadric = np.empty((cluster_count, 4, 4))
+    for i in range(4):
+        for j in range(i, 4):
+            quadric[:, i, j] = quadric[:, j, i] = accumulate(planes[:, i] * planes[:, j] * areas)
+    
+    counts = np.bincount(clusters, minlength=cluster_count)
+    means = np.column_stack([np.bincount(clusters, weights=vertices[:, axis], minlength=cluster_count) for axis in range(3)])
+    means /= np.maximum(counts, 1)[:, None]
+    
+    a = quadric[:, :3, :3]
+    b = quadric[:, :3, 3]
+    regularisation = 1e-3 * np.trace(a, axis1=1, axis2=2) / 3 + 1e-12
+    
+    system = a + regularisation[:, None, None] * np.identity(3)
+    target = regularisation[:, None] * means - b
+    
+    return np.linalg.solve(system, target[..., None])[..., 0]
+
+def decimate(data: PackedModelData, resolution: int):
+    # Vertex clustering on a resolution^3 grid over the bounding box with quadric placement of the new vertices
+    vertices = np.asarray(data.v, dtype=np.float64)
+    triangles, _ = triangulate(data.indices, data.offsets)
+    
+    sizes = np.diff(data.offsets)
+    lines = data.indices[data.offsets[:-1][sizes == 2][:, None] + np.arange(2)]
+    
+    low, high = vertices.min(axis=0), vertices.max(axis=0)
+    cell_size = max(float((high - low).max()) / resolution, np.finfo(np.float32).eps)
+    
+    cells = np.minimum(((vertices - low) / cell_size).astype(np.int64), resolution - 1)
+    keys = (cells[:, 0] * resolution + cells[:, 1]) * resolution + cells[:, 2]
+    
+    _, clusters = np.unique(keys, return_inverse=True)
+    clusters = clusters.ravel()
+    cluster_count = int(clusters.max(initial=-1)) + 1
+    
+    positions = _cluster_positions(vertices, triangles, clusters, cluster_count)
+    
+    def remap(primitives: np.ndarray):
+        primitives = clusters[primitives]
+        
+        sorted_corners = np.sort(primitives, axis=1)
+        distinct = np.all(sorted_corners[:, 1:] != sorted_corners[:, :-1], axis=1)
+        sorted_corners = sorted_corners[distinct]
+        
+        # Rows are told apart by one integer where it fits, np.unique over rows holds the GIL for the whole sort
+        if cluster_count ** sorted_corners.shape[1] < 1 << 63:
+            keys = np.zeros(len(sorted_corners), dtype=np.int64)
+            for corner in sorted_corners.T:
+                keys = keys * cluster_count + corner
+            
+            _, first = np.unique(keys, return_index=True)
+        else:
+            _, first = np.unique(sorted_corners, axis=0, return_index=True)
+        
+        return primitives[distinct][np.sort(first)]
+    
+    triangles, lines = remap(triangles), remap(lines)
+    
+    offsets = np.concatenate((np.arange(len(triangles) + 1) * 3, 3 * len(triangles) + np.arange(1, len(lines) + 1) * 2))
+    indices = np.concatenate((triangles.ravel(), lines.ravel())).astype(np.int32)
+    
+    return LodLevel(PackedModelData(positions.astype(np.float32), indices, offsets.astype(np.int64)), cell_size)
+
+def build_lods(data: PackedModelData, max_levels: int = LOD_LEVELS):
+    # Level 0 is the mesh itself, every further level keeps roughly a quarter of the faces of the previous one
+    levels = [LodLevel(data, 0.0)]
+    face_count = len(data.offsets) - 1
+    
+    resolution = 2 ** int(np.ceil(np.log2(max(np.sqrt(face_count), 2))))
+    
+    while len(levels) < max_levels and resolution >= 2 and face_count > LOD_MIN_FACES:
+        level = decimate(data, resolution)
+        level_faces = len(level.data.offsets) - 1
+        
+        if level_faces <= 0.75 * face_count:
+            levels.append(level)
+            face_count = level_faces
+        
+        resolution //= 2
+    
+    return levels
+
+class LevelOfDetail:
+    # Picks the coarsest level whose error stays under pixel_error on screen. The budget grows while frames take
+    # longer than target_frame_time and shrinks back once there is headroom again
+    def __init__(self, levels: list[LodLevel], target_frame_time: float = 1 / 60, pixel_error: float = LOD_PIXEL_ERROR):
+        self.levels = levels
+        self.target_frame_time = target_frame_time
+        
+        self.base_pixel_error = pixel_error
+        self.pixel_error = pixel_error
+    
+    def record_frame_time(self, seconds: float):
+        if seconds > 1.1 * self.target_frame_time:
+            self.pixel_error = min(self.pixel_error * 1.25, LOD_MAX_PIXEL_ERROR)
+        elif seconds < 0.7 * self.target_frame_time:
+            self.pixel_error = max(self.pixel_error / 1.25, self.base_pixel_error)
+    
+    def select(self, pixels_per_unit: float):
+        for index in reversed(range(len(self.levels))):
+            if self.levels[index].error * pixels_per_unit <= self.pixel_error:
+                return index
+        
+        return 0
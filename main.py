@@ -1,7 +1,13 @@
 import os
 from sys import argv, exit
 
-if len(argv) == 2:
+# Projects the next frame on a second thread while the current one is drawn, at the cost of a frame of latency
+use_pipeline = "--pipeline" in argv
+# Draws the model while it is still loading, from the first part of the file on
+use_stream = "--stream" in argv
+argv = [arg for arg in argv if arg not in ("--pipeline", "--stream")]
+
+if len(argv) in (2, 3):
     model_path = argv[1]\
         .strip()\
         .removeprefix('"')\
@@ -10,7 +16,10 @@ if len(argv) == 2:
         .removesuffix("'")
     if not os.path.exists(model_path):
         raise FileNotFoundError("File: '{model_path}' does not exist")
-elif len(argv) > 2:
+    
+    # Optional per-frame stage timings, .csv or JSON lines
+    trace_path = argv[2] if len(argv) == 3 else None
+elif len(argv) > 3:
     raise ValueError("Too many arguements passed")
 else:
     raise ValueError("Not enough arguements passed")
@@ -18,30 +27,156 @@ else:
 
 import pygame
 from constants import *
-from parser import parse_obj
+from parser import parse_model, ObjStream
 from models import KeyBoardControlledBox
+from labels import LabelRenderer, system_font
+from profiler import FrameProfiler
+from simulation import SimulationClock
 
-pygame.init()
-
+# Only the display and fonts are used, set_mode and system_font start them. pygame.init would also start audio and joysticks
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 clock = pygame.time.Clock()
 
 
-font = pygame.font.SysFont("Cambria", 20)
+font = system_font("Cambria", 20)
+
+# Binary formats are mapped in one go, only OBJ is worth streaming
+if use_stream and os.path.splitext(model_path)[1].lower() not in (".ply", ".stl"):
+    stream = ObjStream(model_path)
+    model = KeyBoardControlledBox(screen, clock, PackedModelData.empty())
+else:
+    stream = None
+    model = KeyBoardControlledBox(screen, clock, parse_model(model_path))
+
+profiler = FrameProfiler()
+model.profiler = profiler
+if trace_path is not None:
+    profiler.open_trace(trace_path)
+
+display_flag = DisplayFlags.VERTEX.value | DisplayFlags.VERTEX_I.value | DisplayFlags.WIRE.value
+# Index labels are drawn on the full mesh, coarser levels of detail are only worth building without them
+use_lod = display_flag & DisplayFlags.VERTEX_I.value != DisplayFlags.VERTEX_I.value
+if use_lod and stream is None:
+    model.enable_lod()
+
+# F3 toggles the stage timings overlay
+show_profile = False
+profile_labels = LabelRenderer(system_font("Monospace", 15), "white")
+
+# The model is only drawn again when something it depends on changed, overlays are drawn over a copy of
+# the last model frame and only the rectangles they touch are sent to the display
+frame = screen.copy()
+frame_state = None
+overlay_rects = []
+overlay_state = None
+
+# Input and animation run in fixed steps, frames are drawn between the last two of them. A slow frame
+# just means several steps before the next one, never a slower model
+simulation = SimulationClock()
+elapsed = 0
+
+if use_pipeline:
+    from pipeline import ProjectionPipeline
+    
+    pipeline = ProjectionPipeline(model)
+else:
+    pipeline = None
 
-model = KeyBoardControlledBox(screen, clock, parse_obj(model_path))
+# The vertex and face under the mouse in the frame on screen, a click prints them
+picked = None
+drawn_projection = None
 
 while True:
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            profiler.close_trace()
+            if pipeline is not None:
+                pipeline.close()
             pygame.quit()
             exit()
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            show_profile = not show_profile
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and picked is not None:
+            print("vertex {} face {}".format(*picked))
+        if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+            frame_state = None
+    
+    if stream is not None:
+        for batch in stream.poll():
+            model.append(batch)
+        
+        if stream.done:
+            if use_lod:
+                model.enable_lod()
+            stream = None
+    
+    for _ in range(simulation.advance(elapsed)):
+        model.step(simulation.step)
+    model.interpolate(simulation.alpha)
+    
+    if pipeline is None:
+        projection = None
+        state = model.frame_state(display_flag)
+    else:
+        # Drawn while the worker projects the pose that was just simulated
+        projection = pipeline.collect()
+        pipeline.submit(display_flag)
+        state = projection and (display_flag, projection.state, projection.mesh)
+    
+    dirty = []
+    redraw = state is not None and state != frame_state
+    
+    if redraw:
+        screen.fill("black")
+        model.draw(display_flag, projection)
         
-    model.run(DisplayFlags.VERTEX.value | DisplayFlags.VERTEX_I.value | DisplayFlags.WIRE.value)
+        frame = screen.copy()
+        frame_state = state
+        drawn_projection = projection
+        dirty.append(screen.get_rect())
+        overlay_rects = []
     
+    # Picking indexes every pose drawn, so nothing is picked until the model stops moving, and faces only
+    # when they are filled
+    picked = None
+    if frame_state is not None and not redraw and pygame.mouse.get_focused():
+        mouse = pygame.mouse.get_pos()
+        
+        face = None
+        if display_flag & DisplayFlags.FACE.value == DisplayFlags.FACE.value:
+            face = model.pick_face(*mouse, projection=drawn_projection)
+        
+        picked = model.pick_vertex(*mouse, projection=drawn_projection), face
+    
+    fps = str(int(clock.get_fps()))
+    loading = stream and f"Loading {stream.progress:.0%}"
+    
+    if redraw or show_profile or (fps, show_profile, loading, picked) != overlay_state:
+        for rect in overlay_rects:
+            screen.blit(frame, rect, rect)
+        dirty += overlay_rects
+        
+        overlay_rects = [screen.blit(font.render(fps, False, "White"), (10, 10))]
+        if show_profile:
+            overlay_rects += profiler.draw(screen, profile_labels)
+        if loading:
+            overlay_rects.append(screen.blit(font.render(loading, False, "White"), (10, HEIGHT - 30)))
+        if picked is not None and picked != (None, None):
+            vertex, face = picked
+            overlay_rects.append(screen.blit(font.render(f"vertex {vertex}  face {face}", False, "White"), (10, HEIGHT - 55)))
+            
+            if vertex is not None:
+                x, y = model.picking_grid(drawn_projection).points[vertex]
+                overlay_rects.append(pygame.draw.rect(screen, "yellow", (x - POINT_SIZE, y - POINT_SIZE, 2 * POINT_SIZE, 2 * POINT_SIZE), 1))
+        dirty += overlay_rects
+        
+        overlay_state = fps, show_profile, loading, picked
     
-    screen.blit(font.render(str(int(clock.get_fps())), False, "White"), (10, 10))
+    with profiler.stage("display"):
+        if dirty:
+            pygame.display.update(dirty)
+    elapsed = clock.tick(60) / 1000
     
-    pygame.display.update()
-    screen.fill("black")
-    clock.tick(60)
\ No newline at end of file
+    if redraw and model.lod is not None:
+        model.lod.record_frame_time(clock.get_rawtime() / 1000)
+    profiler.end_frame()
\ No newline at end of file
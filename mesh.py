@@ -0,0 +1,170 @@
+import weakref
+
+import numpy as np
+
+from constants import PackedModelData
+
+
+def triangulate(indices: np.ndarray, offsets: np.ndarray):
+    # Fan triangulation of every face with 3 or more corners, lines and points produce no triangles
+    sizes = np.diff(offsets)
+    counts = np.maximum(sizes - 2, 0)
+    
+    faces = np.repeat(np.arange(len(sizes)), counts)
+    first = offsets[:-1][faces]
+    step = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+    
+    triangles = np.column_stack((indices[first], indices[first + step], indices[first + step + 1])).astype(np.int32)
+    
+    return triangles, faces
+
+def triangle_normals(vertices: np.ndarray, triangles: np.ndarray):
+    a, b, c = (vertices[triangles[:, i]] for i in range(3))
+    
+    return np.cross(b - a, c - a)
+
+def face_edges(indices: np.ndarray, offsets: np.ndarray):
+    # Every side of every polygon, 2 corner faces are a single line and 1 corner faces have no sides
+    sizes = np.diff(offsets)
+    corner_faces = np.repeat(np.arange(len(sizes)), sizes)
+    
+    corners = np.arange(len(indices))
+    following = corners + 1
+    following[offsets[1:][sizes > 0] - 1] = offsets[:-1][sizes > 0]
+    
+    corner_sizes = sizes[corner_faces]
+    keep = (corner_sizes >= 3) | ((corner_sizes == 2) & (corners == offsets[:-1][corner_faces]))
+    
+    return np.column_stack((indices[corners[keep]], indices[following[keep]]))
+
+def unique_edges(indices: np.ndarray, offsets: np.ndarray):
+    # Sides shared by neighbouring faces (and repeated line faces) are kept once
+    edges = np.sort(face_edges(indices, offsets), axis=1).astype(np.int64)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    
+    stride = int(indices.max(initial=0)) + 1
+    keys = np.unique(edges[:, 0] * stride + edges[:, 1])
+    
+    return np.column_stack(np.divmod(keys, stride)).astype(np.int32)
+
+class Mesh:
+    # Geometry derived from one model data, built on first use and shared by every model drawing that data
+    _shared: "weakref.WeakValueDictionary[int, Mesh]" = weakref.WeakValueDictionary()
+    
+    def __init__(self, data: PackedModelData):
+        self.data = data
+        self.lods = None
+        
+        self._triangles = None
+        self._edges = None
+        self._bounds = None
+    
+    @classmethod
+    def of(cls, data: PackedModelData):
+        mesh = cls._shared.get(id(data))
+        
+        if mesh is None or mesh.data is not data:
+            mesh = cls._shared[id(data)] = cls(data)
+        
+        return mesh
+    
+    @property
+    def vertices(self):
+        return self.data.v
+    
+    @property
+    def triangles(self):
+        # (triangles, source face of each triangle, model space normals)
+        if self._triangles is None:
+            triangles, faces = triangulate(self.data.indices, self.data.offsets)
+            self._triangles = triangles, faces, triangle_normals(self.data.v, triangles)
+        
+        return self._triangles
+    
+    @property
+    def edges(self):
+        if self._edges is None:
+            self._edges = unique_edges(self.data.indices, self.data.offsets)
+        
+        return self._edges
+    
+    @property
+    def bounds(self):
+        # Model space axis aligned box as (low, high)
+        if self._bounds is None:
+            if len(self.data.v):
+                self._bounds = self.data.v.min(axis=0), self.data.v.max(axis=0)
+            else:
+                self._bounds = np.zeros(3), np.zeros(3)
+        
+        return self._bounds
+
+class GrowingArray:
+    # Rows appended in amortised constant time into a backing array that doubles when full. `array` is a
+    # view of the filled rows, earlier views stay valid because appending only writes past them
+    def __init__(self, row_shape: tuple[int, ...], dtype):
+        self._data = np.empty((0, *row_shape), dtype=dtype)
+        self.size = 0
+    
+    def extend(self, rows: np.ndarray):
+        end = self.size + len(rows)
+        
+        if end > len(self._data):
+            data = np.empty((max(end, 2 * len(self._data)), *self._data.shape[1:]), dtype=self._data.dtype)
+            data[:self.size] = self._data[:self.size]
+            self._data = data
+        
+        self._data[self.size:end] = rows
+        self.size = end
+    
+    @property
+    def array(self):
+        return self._data[:self.size]
+
+class MeshBuilder:
+    # A mesh arriving in batches. Only the new faces of every batch are triangulated and split into edges,
+    # mesh hands out a snapshot of everything so far that later batches never change
+    def __init__(self):
+        self._v = GrowingArray((3,), np.float32)
+        self._indices = GrowingArray((), np.int32)
+        self._offsets = GrowingArray((), np.int64)
+        self._offsets.extend(np.zeros(1, dtype=np.int64))
+        
+        self._triangles = GrowingArray((3,), np.int32)
+        self._faces = GrowingArray((), np.intp)
+        self._normals = GrowingArray((3,), np.float32)
+        self._edges = GrowingArray((2,), np.int32)
+        
+        self._bounds = np.zeros(3), np.zeros(3)
+    
+    def extend(self, batch: PackedModelData):
+        # Batch indices count from the first vertex of the whole mesh, and may only use vertices that already arrived
+        face_count = self._offsets.size - 1
+        
+        self._v.extend(batch.v)
+        self._indices.extend(batch.indices)
+        self._offsets.extend(batch.offsets[1:] + self._offsets.array[-1])
+        
+        triangles, faces = triangulate(batch.indices, batch.offsets)
+        self._triangles.extend(triangles)
+        self._faces.extend(faces + face_count)
+        self._normals.extend(triangle_normals(self._v.array, triangles))
+        
+        # Sides shared by faces of different batches are kept once per batch
+        self._edges.extend(unique_edges(batch.indices, batch.offsets))
+        
+        if len(batch.v):
+            low, high = batch.v.min(axis=0), batch.v.max(axis=0)
+            
+            if self._v.size > len(batch.v):
+                low, high = np.minimum(low, self._bounds[0]), np.maximum(high, self._bounds[1])
+            
+            self._bounds = low, high
+    
+    def mesh(self):
+        mesh = Mesh(PackedModelData(self._v.array, self._indices.array, self._offsets.array))
+        mesh._triangles = self._triangles.array, self._faces.array, self._normals.array
+        mesh._edges = self._edges.array
+        mesh._bounds = self._bounds
+        
+        return mesh
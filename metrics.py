@@ -0,0 +1,52 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from constants import ModelData, PackedModelData
+from mesh import triangulate
+
+
+@dataclass
+class MeshMetrics:
+    # Per face vector areas (normal times area), zero for points and lines
+    vector_areas: np.ndarray
+    volume: float
+    bounds: tuple[np.ndarray, np.ndarray]
+    
+    @property
+    def areas(self):
+        return np.sqrt(np.einsum("ij,ij->i", self.vector_areas, self.vector_areas))
+    
+    @property
+    def normals(self):
+        # Unit normals, zero where a face has no area
+        areas = self.areas[:, None]
+        
+        return np.divide(self.vector_areas, areas, out=np.zeros_like(self.vector_areas), where=areas > 0)
+    
+    @property
+    def surface_area(self):
+        return float(self.areas.sum())
+
+def mesh_metrics(data: ModelData | PackedModelData):
+    # Everything comes from one fan triangulation. Summing the cross products of a fan gives a polygon's
+    # vector area exactly when it is planar, convex or not, and the signed tetrahedra the same fans make with
+    # any fixed point add up to the enclosed volume of a closed, consistently wound mesh
+    data = PackedModelData.pack(data)
+    vertices = np.asarray(data.v, dtype=np.float64)
+    
+    if len(vertices):
+        bounds = vertices.min(axis=0), vertices.max(axis=0)
+    else:
+        bounds = np.zeros(3), np.zeros(3)
+    
+    # Measured about the middle of the box, keeps the volume accurate for models far from the origin
+    triangles, faces = triangulate(data.indices, data.offsets)
+    a, b, c = (vertices[triangles[:, i]] - (bounds[0] + bounds[1]) / 2 for i in range(3))
+    
+    crosses = np.cross(b - a, c - a)
+    vector_areas = np.column_stack([np.bincount(faces, weights=crosses[:, axis], minlength=len(data.offsets) - 1) for axis in range(3)]) / 2
+    
+    volume = float(np.einsum("ij,ij->", a, np.cross(b, c))) / 6
+    
+    return MeshMetrics(vector_areas, volume, bounds)
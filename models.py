@@ -1,15 +1,49 @@
+import threading
+
+import numpy as np
 import pygame
 from constants import *
-from typing import Any, Callable
+from dataclasses import dataclass
 from point_data import Vec3, AngleVec3, Transforms
+from mesh import Mesh, MeshBuilder
+from raster import Rasterizer, flat_shade
+from culling import clip_edges, clip_triangles, cull_triangles, visible_points
+from labels import LabelRenderer, system_font
+from lod import LevelOfDetail, build_lods
+from profiler import NULL_PROFILER
+from picking import PickingGrid
+
+@dataclass
+class Projection:
+    # A model's vertices projected for one frame, with everything they were projected with
+    state: tuple
+    world: np.ndarray
+    matrix: np.ndarray
+    mesh: Mesh
+    clip: np.ndarray | None = None
+    points: np.ndarray | None = None
+    
+    # Both steps only run numpy calls that release the GIL, and can write into preallocated buffers
+    def transform(self, out: np.ndarray | None = None):
+        self.clip = Transforms.apply_matrix(self.mesh.vertices, self.matrix, out)
+    
+    def project(self, out: np.ndarray | None = None):
+        self.points, _ = Transforms.project_array(self.clip, out)
+
+def _build_mesh_lods(mesh: Mesh):
+    # Runs on a worker thread, the levels are only handed over once all of them are built
+    mesh.lods = build_lods(mesh.data)
 
 class BaseModel:
-    def __init__(self, screen: pygame.Surface, data: ModelData, origin: Vec3 = Vec3(0, 0, 1), *args, **kwargs):
+    def __init__(self, screen: pygame.Surface, data: ModelData | PackedModelData, origin: Vec3 = Vec3(0, 0, 1), *args, **kwargs):
         self.screen = screen
-        self.font = pygame.font.SysFont("Monospace", 15)
+        self.font = system_font("Monospace", 15)
+        self.labels = LabelRenderer(self.font, "green")
+        
+        self.data = PackedModelData.pack(data)
         
-        self.vertices = [Vec3(*vertex) for vertex in data.v]
-        self.faces = data.f
+        # Models built from the same data share one mesh, and with it one vertex buffer
+        self.base_mesh = self.mesh = Mesh.of(self.data)
         
         self.origin = origin
         
@@ -17,68 +51,318 @@ class BaseModel:
         self.scale = Vec3(1, 1, 1)
         self.angle = AngleVec3(0, 0, 0)
         
+        self.parent: BaseModel | None = None
+        
+        # Pose before the last simulation step and how far to blend from it, see step and interpolate
+        self._previous_pose = None
+        self._alpha = 1.0
+        
+        self.rasterizer = Rasterizer()
+        # A scene sharing one rasterizer between models clears the depth buffer once per frame itself
+        self.clear_depth = True
+        self.backface_culling = True
+        # Whether the last draw filled faces, the depth buffer is only that frame's when it did
+        self._faces_drawn = False
+        
+        self.lod: LevelOfDetail | None = None
+        self.lod_level = 0
+        self._level_meshes: list[Mesh] = []
+        # Frame time the levels of detail aim for, None while they are off, and the mesh they are being built for
+        self._lod_target: float | None = None
+        self._lod_build: tuple[Mesh, threading.Thread] | None = None
+        
+        # Grows the mesh as batches arrive, see append
+        self._builder: MeshBuilder | None = None
+        
+        self._projection: Projection | None = None
+        self._bounds_state = None
+        self._world_bounds = None
+        # (projection state, mesh) and the picking grid made for them
+        self._picking: tuple[tuple, PickingGrid] | None = None
+        
+        self.profiler = NULL_PROFILER
+        
         self.Update_init(*args, **kwargs)
     
+    @property
+    def faces(self):
+        return self.data.f
+    
+    @property
+    def vertices(self):
+        return self.mesh.vertices
+    
+    @property
+    def face_indices(self):
+        return self.mesh.data.indices
+    
+    @property
+    def face_offsets(self):
+        return self.mesh.data.offsets
+    
+    @property
+    def triangles(self):
+        return self.mesh.triangles
+    
+    @property
+    def edges(self):
+        return self.mesh.edges
+    
+    def append(self, batch: PackedModelData):
+        # Adds a batch of streamed faces and vertices, drawn from the next frame on. Texture coordinates,
+        # normals and groups are not kept, and levels of detail have to be enabled again once everything arrived
+        if self._builder is None:
+            self._builder = MeshBuilder()
+            self._builder.extend(self.data)
+        
+        self._builder.extend(batch)
+        
+        self.base_mesh = self.mesh = self._builder.mesh()
+        self.data = self.mesh.data
+        
+        self.lod = None
+        self.lod_level = 0
+        self._level_meshes = []
+        self._lod_target = None
+        
+        self.invalidate_projection()
+        self._bounds_state = None
+    
+    # Level of detail
+    def enable_lod(self, target_frame_time: float = 1 / 60):
+        # The levels are built the first time a coarser one could be drawn, see _lod_levels
+        self._lod_target = target_frame_time
+    
+    def _lod_levels(self):
+        # Levels of the full mesh, None while a worker thread builds them. The full mesh is drawn until then
+        mesh = self.base_mesh
+        
+        if mesh.lods is None and (self._lod_build is None or self._lod_build[0] is not mesh):
+            thread = threading.Thread(target=_build_mesh_lods, args=(mesh,), daemon=True)
+            thread.start()
+            
+            self._lod_build = mesh, thread
+        
+        return mesh.lods
+    
+    def _pixels_per_unit(self):
+        # How many pixels one model unit covers at the nearest point of the model's bounding sphere
+        world = self.world_matrix()
+        low, high = self.base_mesh.bounds
+        
+        scale = np.linalg.norm(world[:3, :3], axis=0).max()
+        centre = Transforms.apply_matrix(((low + high) / 2)[None], world)[0]
+        depth = max(centre[2] - scale * np.linalg.norm(high - low) / 2, NEAR_PLANE)
+        
+        return scale * self.screen.get_width() / 2 / depth
+    
+    def _set_level(self, level: int):
+        if level == self.lod_level:
+            return
+        
+        self.lod_level = level
+        self.mesh = self._level_meshes[level]
+        
+        self.invalidate_projection()
+    
     # Display Logic
-    def _transform(self, vertex: Vec3, *transformations: tuple[Callable[[Vec3, Any], Vec3], list]):
-        for fn, params in transformations:
-            vertex = fn(vertex, *params)
+    def pose(self):
+        # Position, scale and angle to draw, between the last two simulation steps when stepping
+        if self._previous_pose is None:
+            return self.position, self.scale, self.angle
         
-        vertex_prime = vertex.project()
+        position, scale, angle = self._previous_pose
+        alpha = self._alpha
         
-        return vertex_prime
+        return (
+            position + (self.position - position) * alpha,
+            scale + (self.scale - scale) * alpha,
+            # Angles take the short way round
+            AngleVec3(*(old + ((new - old + 180) % 360 - 180) * alpha for old, new in zip(angle, self.angle))),
+        )
     
-    def _project_vertex(self, vertex: Vec3):
-        return self._transform(
-                vertex,
-                (Transforms.rotate, (self.angle,)),
-                (Transforms.scale, (self.scale,)),
-                (Transforms.translate, (self.position + self.origin,))
-            ).project(self.screen)
+    def local_matrix(self):
+        position, scale, angle = self.pose()
+        
+        return Transforms.model_matrix(angle, scale, position + self.origin)
     
-    # Display
-    def _draw_point_data(self, show_vertex: bool, show_vertex_indices: bool):
-        for i, vertex in enumerate(self.vertices):
-            v = self._project_vertex(vertex)
+    def world_matrix(self):
+        if self.parent is None:
+            return self.local_matrix()
+        
+        return self.parent.world_matrix() @ self.local_matrix()
+    
+    def _new_projection(self):
+        world = self.world_matrix()
+        
+        return Projection(self._transform_state(), world, Transforms.compose(Transforms.viewport_matrix(self.screen), world), self.mesh)
+    
+    def prepare_projection(self, display_flag: int):
+        # Picks the level of detail and captures the transform, the projection itself can then be done anywhere
+        self._select_level(display_flag)
+        
+        return self._new_projection()
+    
+    def _transform_state(self):
+        position, scale, angle = self.pose()
+        state = (*position, *scale, *angle, *self.origin, self.screen.get_size())
+        
+        if self.parent is not None:
+            state += self.parent._transform_state()
+        
+        return state
+    
+    def _projected_vertices(self):
+        projection = self._projection
+        
+        if projection is None or projection.state != self._transform_state() or projection.mesh is not self.mesh:
+            projection = self._new_projection()
             
-            if not v.at_infinity:
-                if show_vertex:
-                    pygame.draw.rect(self.screen, "green", (v.x - POINT_SIZE / 2, v.y - POINT_SIZE / 2, POINT_SIZE, POINT_SIZE))
-                
-                if show_vertex_indices:
-                    text_surf = self.font.render(str(i), True, "green")
-                    self.screen.blit(text_surf, text_surf.get_rect(midbottom=(v.x, v.y - POINT_SIZE / 2)))
-    
-    def _draw_surface_data(self, show_wireframe: bool, show_face: bool):
-        for face in self.faces:
-            for index, vert_index in enumerate(face):
-                if len(face) == 2 and index == 1:
-                    break
-                
-                v1 = self.vertices[vert_index]
-                v2 = self.vertices[face[(index + 1) % len(face)]]
-                
-                p1 = self._project_vertex(v1)
-                p2 = self._project_vertex(v2)
+            with self.profiler.stage("transform"):
+                projection.transform()
+            with self.profiler.stage("projection"):
+                projection.project()
+            
+            self._projection = projection
+        
+        return projection
+    
+    def frame_state(self, display_flag: int):
+        # Everything a drawn frame depends on, the same state draws the same frame
+        return display_flag, self._transform_state(), self.base_mesh
+    
+    def invalidate_projection(self):
+        self._projection = None
+    
+    def world_bounds(self):
+        # View space axis aligned box around the transformed model space box, found from its 8 corners
+        # so culling a model never touches its vertices
+        state = self._transform_state()
+        
+        if state != self._bounds_state:
+            low, high = self.base_mesh.bounds
+            corners = np.array([[(low, high)[(i >> axis) & 1][axis] for axis in range(3)] for i in range(8)])
+            corners = Transforms.apply_matrix(corners, self.world_matrix())
+            
+            self._world_bounds = corners.min(axis=0), corners.max(axis=0)
+            self._bounds_state = state
+        
+        return self._world_bounds
+    
+    # Display
+    def _draw_point_data(self, points: np.ndarray, depth: np.ndarray, show_vertex: bool, show_vertex_indices: bool):
+        visible = np.flatnonzero(visible_points(points, depth, *self.screen.get_size(), margin=POINT_SIZE))
+        
+        if show_vertex:
+            with self.profiler.stage("points"):
+                self.rasterizer.draw_points(self.screen, points[visible], POINT_SIZE, "green")
+        
+        if show_vertex_indices:
+            # Nearer vertices win when labels would overlap
+            with self.profiler.stage("labels"):
+                self.labels.draw(self.screen, visible, points[visible] - (0, POINT_SIZE / 2), depth[visible])
+    
+    def _draw_face_data(self, projection: Projection):
+        triangles, _, normals = projection.mesh.triangles
+        
+        clip, triangles, source = clip_triangles(projection.clip, triangles)
+        points, _ = Transforms.project_array(clip)
+        
+        visible = cull_triangles(points, triangles, *self.screen.get_size(), self.backface_culling)
+        source = source[visible]
+        
+        # Normals follow the model through the inverse transpose of its linear part
+        normal_matrix = np.linalg.pinv(projection.world[:3, :3]).T
+        colours = flat_shade(normals[source] @ normal_matrix.T, FACE_COLOUR, LIGHT_DIRECTION, AMBIENT_LIGHT)
+        
+        if self.clear_depth:
+            self.rasterizer.begin(self.screen)
+        self.rasterizer.draw_triangles(self.screen, points, clip[:, 2], triangles[visible], colours)
+    
+    def _draw_surface_data(self, projection: Projection, show_wireframe: bool, show_face: bool):
+        if show_face:
+            with self.profiler.stage("faces"):
+                self._draw_face_data(projection)
+        
+        if show_wireframe:
+            with self.profiler.stage("wireframe"):
+                starts, ends = clip_edges(projection.clip, projection.mesh.edges, *self.screen.get_size())
                 
-                if not (p1.at_infinity + p2.at_infinity):
-                    if show_face:
-                        raise NotImplementedError()
-                        # pygame.draw.rect(self.screen, "white", (p1.coordinates(), p2.coordinates()))
-                    
-                    if show_wireframe:
-                        pygame.draw.line(self.screen, "white", p1.coordinates(), p2.coordinates())
-    
-    def draw(self, display_flag: int):
+                self.rasterizer.draw_lines(self.screen, starts, ends, "white")
+    
+    def _select_level(self, display_flag: int):
+        if self._lod_target is None:
+            return
+        
+        # Index labels refer to the original vertices, so they always get the full mesh
+        if display_flag & DisplayFlags.VERTEX_I.value == DisplayFlags.VERTEX_I.value:
+            self._set_level(0)
+            return
+        
+        if self.lod is None:
+            levels = self._lod_levels()
+            if levels is None:
+                return
+            
+            self.lod = LevelOfDetail(levels, self._lod_target)
+            self._level_meshes = [Mesh.of(level.data) for level in levels]
+        
+        self._set_level(self.lod.select(self._pixels_per_unit()))
+    
+    def draw(self, display_flag: int, projection: Projection | None = None):
+        # Draws the model as it is now, or as it was when the given projection was prepared
         vertices = display_flag & DisplayFlags.VERTEX.value == DisplayFlags.VERTEX.value
         vertex_indices = display_flag & DisplayFlags.VERTEX_I.value == DisplayFlags.VERTEX_I.value
         wireframe = display_flag & DisplayFlags.WIRE.value == DisplayFlags.WIRE.value
         faces = display_flag & DisplayFlags.FACE.value == DisplayFlags.FACE.value
         
-        if vertices + vertex_indices:
-            self._draw_point_data(vertices, vertex_indices)
+        self._faces_drawn = faces
+        
+        if not (vertices + vertex_indices + wireframe + faces):
+            return
+        
+        if projection is None:
+            self._select_level(display_flag)
+            projection = self._projected_vertices()
+        
+        # Surfaces go first so that filled faces never hide the points drawn over them
         if wireframe + faces:
-            self._draw_surface_data(wireframe, faces)
+            self._draw_surface_data(projection, wireframe, faces)
+        if vertices + vertex_indices:
+            self._draw_point_data(projection.points, projection.clip[:, 2], vertices, vertex_indices)
+    
+    # Picking
+    def picking_grid(self, projection: Projection | None = None):
+        # Index of the full mesh as drawn, so picked indices are those of the model's data whatever level of detail
+        # is shown. Only made when something is picked, and again once the model has moved
+        if projection is None:
+            projection = self._projected_vertices()
+        
+        key = projection.state, self.base_mesh
+        
+        if self._picking is None or self._picking[0] != key:
+            with self.profiler.stage("picking"):
+                if projection.mesh is not self.base_mesh:
+                    projection = Projection(projection.state, projection.world, projection.matrix, self.base_mesh)
+                    projection.transform()
+                    projection.project()
+                
+                grid = PickingGrid(projection.clip, projection.points, self.base_mesh.triangles, *self.screen.get_size(), self.backface_culling)
+            
+            self._picking = key, grid
+        
+        return self._picking[1]
+    
+    def pick_vertex(self, x: int, y: int, radius: float = PICK_RADIUS, projection: Projection | None = None):
+        # Vertex nearest the pixel (x, y), as given by pygame.mouse.get_pos, within radius pixels, or None.
+        # Vertices behind the faces filled by the last draw are skipped
+        depth = self.rasterizer.depth if self._faces_drawn else None
+        
+        return self.picking_grid(projection).vertex(x + 0.5, y + 0.5, radius, depth)
+    
+    def pick_face(self, x: int, y: int, projection: Projection | None = None):
+        # Face nearest the camera at the pixel (x, y) when faces are filled, or None
+        return self.picking_grid(projection).face(x + 0.5, y + 0.5)
     
     # Update
     def Update_init(self, *args, **kwargs):
@@ -87,12 +371,25 @@ class BaseModel:
     def Update(self, *args, **kwargs):
         pass
     
-    def run(self, display_flag: int, *args, **kwargs):
-        self.Update(*args, **kwargs)
+    def step(self, dt: float, *args, **kwargs):
+        # One fixed simulation step of dt seconds
+        self._previous_pose = Vec3(*self.position), Vec3(*self.scale), AngleVec3(*self.angle)
+        
+        with self.profiler.stage("update"):
+            self.Update(dt, *args, **kwargs)
+    
+    def interpolate(self, alpha: float):
+        # Draw at alpha of the way from the pose before the last step to the current one
+        self._alpha = alpha
+    
+    def run(self, display_flag: int, dt: float = 1 / SIMULATION_RATE, *args, **kwargs):
+        # One step of dt seconds, drawn at the pose it ends on
+        self.step(dt, *args, **kwargs)
+        self.interpolate(1.0)
         self.draw(display_flag)
 
 class KeyBoardControlledBox(BaseModel):
-    def __init__(self, screen: pygame.Surface, clock: pygame.time.Clock, data: ModelData, origin = Vec3(0, 0, 1)):
+    def __init__(self, screen: pygame.Surface, clock: pygame.time.Clock, data: ModelData | PackedModelData, origin = Vec3(0, 0, 1)):
         super().__init__(screen, data, origin, clock)
     
     def Update_init(self, clock: pygame.time.Clock):
@@ -107,47 +404,48 @@ class KeyBoardControlledBox(BaseModel):
         
         self.clock = clock
     
-    def Update(self):
+    def Update(self, dt: float):
+        # Rates are per second: 2 units of movement or scale, a full turn of rotation
         keys = pygame.key.get_pressed()
         
         if keys[pygame.K_UP]:
-            self.position.z += 2 / self.clock.get_fps()
+            self.position.z += 2 * dt
         if keys[pygame.K_DOWN]:
-            self.position.z -= 2 / self.clock.get_fps()
+            self.position.z -= 2 * dt
         if keys[pygame.K_RIGHT]:
-            self.position.x += 2 / self.clock.get_fps()
+            self.position.x += 2 * dt
         if keys[pygame.K_LEFT]:
-            self.position.x -= 2 / self.clock.get_fps()
+            self.position.x -= 2 * dt
         if keys[pygame.K_PAGEUP]:
-            self.position.y += 2 / self.clock.get_fps()
+            self.position.y += 2 * dt
         if keys[pygame.K_PAGEDOWN]:
-            self.position.y -= 2 / self.clock.get_fps()
+            self.position.y -= 2 * dt
         
         if keys[pygame.K_q]:
-            self.angle.xy += 360 / 60
+            self.angle.xy += 360 * dt
         if keys[pygame.K_z]:
-            self.angle.xy -= 360 / 60
+            self.angle.xy -= 360 * dt
         if keys[pygame.K_d]:
-            self.angle.xz += 360 / 60
+            self.angle.xz += 360 * dt
         if keys[pygame.K_a]:
-            self.angle.xz -= 360 / 60
+            self.angle.xz -= 360 * dt
         if keys[pygame.K_w]:
-            self.angle.yz += 360 / 60
+            self.angle.yz += 360 * dt
         if keys[pygame.K_s]:
-            self.angle.yz -= 360 / 60
+            self.angle.yz -= 360 * dt
         
         if keys[pygame.K_i]:
-            self.scale.z += 2 / self.clock.get_fps()
+            self.scale.z += 2 * dt
         if keys[pygame.K_k]:
-            self.scale.z -= 2 / self.clock.get_fps()
+            self.scale.z -= 2 * dt
         if keys[pygame.K_l]:
-            self.scale.x += 2 / self.clock.get_fps()
+            self.scale.x += 2 * dt
         if keys[pygame.K_j]:
-            self.scale.x -= 2 / self.clock.get_fps()
+            self.scale.x -= 2 * dt
         if keys[pygame.K_HOME]:
-            self.scale.y += 2 / self.clock.get_fps()
+            self.scale.y += 2 * dt
         if keys[pygame.K_END]:
-            self.scale.y -= 2 / self.clock.get_fps()
+            self.scale.y -= 2 * dt
         
         self.angle.xy = self.angle.xy % 360
         self.angle.xz = self.angle.xz % 360
@@ -169,21 +467,22 @@ class KeyBoardControlledBox(BaseModel):
             self._i_yz_angle = self.angle.yz
         
         if self._is_resetting:
-            dt = 2 / self.clock.get_fps()
+            # The reset eases back over half a second
+            progress = 2 * dt
             
-            self.position.x -= self._i_dx * dt
-            self.position.y -= self._i_dy * dt
-            self.position.z -= self._i_dz * dt
+            self.position.x -= self._i_dx * progress
+            self.position.y -= self._i_dy * progress
+            self.position.z -= self._i_dz * progress
             
-            self.scale.x -= self._i_sx * dt
-            self.scale.y -= self._i_sy * dt
-            self.scale.z -= self._i_sz * dt
+            self.scale.x -= self._i_sx * progress
+            self.scale.y -= self._i_sy * progress
+            self.scale.z -= self._i_sz * progress
             
-            self.angle.xy -= self._i_xy_angle * dt
-            self.angle.xz -= self._i_xz_angle * dt
-            self.angle.yz -= self._i_yz_angle * dt
+            self.angle.xy -= self._i_xy_angle * progress
+            self.angle.xz -= self._i_xz_angle * progress
+            self.angle.yz -= self._i_yz_angle * progress
             
-            self._reset_time += dt
+            self._reset_time += progress
             
             if self._reset_time >= 1:
                 self._is_resetting = False
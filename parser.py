@@ -1,60 +1,690 @@
-from constants import ModelData
-
-def parse_obj(path: str):
-    with open(path) as file:
-        file_data = file.readlines()
-    
-    vertices = []
-    faces = []
-    
-    for line in file_data:
-        line = line.strip()
-        
-        line_data = line.split()
-        
-        s_data = None
-        
-        if line.startswith("v "):
-            _, x, y, z = line_data
-            
-            vertices.append((float(x), float(y), float(z)))
-        elif line.startswith("f "):
-            line_data.pop(0)
-            
-            s_data = []
-            
-            for coord in line_data:
-                u_f_data = coord.split("/")
-                
-                f_fin_data = None
-                
-                # Face index
-                if len(u_f_data) == 1:
-                    f_data = int(u_f_data[0]) - 1
-                    
-                    f_fin_data = f_data
-                # Face index + Texture index
-                elif len(u_f_data) == 2:
-                    f_data, t_data = u_f_data
-                    f_data = int(f_data) - 1
-                    
-                    f_fin_data = f_data # TODO  Implement textures
-                # Face index + Texture index + Normal vector
-                elif len(u_f_data) == 3:
-                    f_data, t_data, vn_data = u_f_data
-                    f_data = int(f_data) - 1
-                    
-                    f_fin_data = f_data # TODO  Implement vector normals
-                
-                if f_fin_data is not None:
-                    s_data.append(f_fin_data)
-            
-            faces.append(s_data)
+import hashlib
+import os
+import queue
+import re
+import shutil
+import threading
+from dataclasses import dataclass
+from itertools import repeat
+
+import numpy as np
+
+from constants import FaceGroups, PackedModelData, CACHE_DIR
+
+CHUNK_SIZE = 1 << 24
+# Small enough that the first batch of a streamed file arrives within a frame or two
+STREAM_CHUNK_SIZE = 1 << 20
+MIN_RANGE_SIZE = 1 << 20
+CACHE_VERSION = 3
+
+# Line kinds, decided from the first two bytes of every line
+_OTHER, _VERTEX, _TEXTURE, _NORMAL, _FACE = range(5)
+_GROUP_KEYWORDS = {"o": "objects", "g": "groups", "usemtl": "materials"}
+_MAX_SLICED_RUNS = 64
+
+_LEADING_BLANKS = re.compile(rb"^[ \t]+", re.MULTILINE)
+_SINGLE_CORNER = re.compile(rb"(?<!\S)(-?\d+)(?!\S)")
+_PAIR_CORNER = re.compile(rb"(?<!\S)(-?\d+/-?\d+)(?!\S)")
+
+
+@dataclass
+class _Chunk:
+    v: np.ndarray
+    vt: np.ndarray
+    vn: np.ndarray
+    
+    sizes: np.ndarray
+    
+    # Corner indices are 0-based, -1 when absent; entries flagged in `relative` came from negative
+    # OBJ indices and are still relative to the first element of their kind in this chunk
+    indices: np.ndarray
+    texture_indices: np.ndarray | None
+    normal_indices: np.ndarray | None
+    relative: tuple[np.ndarray, np.ndarray | None, np.ndarray | None]
+    
+    # (field name, group name, face index within the chunk)
+    groups: list[tuple[str, str, int]]
+
+
+# Streaming
+def _read_chunks(path: str, chunk_size: int = CHUNK_SIZE, start: int = 0, end: int | None = None):
+    with open(path, "rb") as file:
+        file.seek(start)
+        
+        remaining = (os.path.getsize(path) if end is None else end) - start
+        remainder = b""
+        
+        while remaining > 0 and (chunk := file.read(min(chunk_size, remaining))):
+            remaining -= len(chunk)
+            chunk = remainder + chunk
+            cut = chunk.rfind(b"\n") + 1
+            
+            remainder = chunk[cut:]
+            
+            if cut:
+                yield chunk[:cut]
+        
+        if remainder:
+            yield remainder + b"\n"
+
+def _token_counts(text: bytes):
+    # Number of whitespace separated tokens on every "\n" terminated line of `text`, without a Python loop per line
+    buffer = np.frombuffer(text, dtype=np.uint8)
+    
+    blank = (buffer == ord(" ")) | (buffer == ord("\t")) | (buffer == ord("\r")) | (buffer == ord("\n"))
+    token_starts = ~blank
+    token_starts[1:] &= blank[:-1]
+    
+    totals = np.cumsum(token_starts)[buffer == ord("\n")]
+    
+    return np.diff(totals, prepend=0)
+
+def _classify_lines(chunk: bytes):
+    buffer = np.frombuffer(chunk, dtype=np.uint8)
+    
+    starts = np.zeros(np.count_nonzero(buffer == ord("\n")) + 1, dtype=np.int64)
+    starts[1:] = np.flatnonzero(buffer == ord("\n")) + 1
+    
+    first = buffer[starts[:-1]]
+    second = buffer[np.minimum(starts[:-1] + 1, len(buffer) - 1)]
+    separated = (second == ord(" ")) | (second == ord("\t"))
+    
+    kinds = np.full(len(first), _OTHER, dtype=np.int8)
+    kinds[(first == ord("v")) & separated] = _VERTEX
+    kinds[(first == ord("v")) & (second == ord("t"))] = _TEXTURE
+    kinds[(first == ord("v")) & (second == ord("n"))] = _NORMAL
+    kinds[(first == ord("f")) & separated] = _FACE
+    
+    return starts, first, kinds
+
+def _gather_lines(chunk: bytes, starts: np.ndarray, kinds: np.ndarray, kind: int):
+    mask = np.zeros(len(kinds) + 2, dtype=np.int8)
+    mask[1:-1] = kinds == kind
+    
+    edges = np.flatnonzero(np.diff(mask))
+    
+    if len(edges) > 2 * _MAX_SLICED_RUNS:
+        # Interleaved records (v/vn/vt per vertex), select their bytes with a mask instead
+        selected = np.repeat(kinds == kind, np.diff(starts))
+        
+        return np.frombuffer(chunk, dtype=np.uint8)[selected].tobytes()
+    
+    # Records of one kind usually come in long contiguous runs which can be sliced out directly
+    run_starts, run_ends = starts[edges[::2]].tolist(), starts[edges[1::2]].tolist()
+    
+    return b"".join(chunk[start:end] for start, end in zip(run_starts, run_ends))
+
+def _parse_floats(text: bytes, keyword: bytes, count: int, width: int):
+    tokens = text.replace(keyword, b" ").split()
+    
+    if len(tokens) != width * count:
+        # Extra components (w, vertex colours, ...) are dropped, missing ones are padded with 0
+        tokens = [
+            token
+            for line in text.splitlines()
+            for token in (line.split()[1:width + 1] + [b"0"] * width)[:width]
+        ]
+    
+    return np.array(tokens, dtype=np.float32).reshape(-1, width)
+
+def _parse_corners(text: bytes, corner_count: int):
+    slashes = text.count(b"/")
+    
+    if not slashes:
+        return np.array(text.split(), dtype=np.int32), None, None
+    
+    # Bring every corner to the v/vt/vn form, 0 standing for a missing index
+    text = text.replace(b"//", b"/0/")
+    
+    if text.count(b"/") != 2 * corner_count:
+        text = _SINGLE_CORNER.sub(rb"\1/0/0", text)
+        text = _PAIR_CORNER.sub(rb"\1/0", text)
+    
+    corners = np.array(text.replace(b"/", b" ").split(), dtype=np.int32).reshape(-1, 3)
+    
+    return corners[:, 0].copy(), corners[:, 1].copy(), corners[:, 2].copy()
+
+def _resolve_indices(raw: np.ndarray, kinds: np.ndarray, kind: int, sizes: np.ndarray):
+    relative = raw < 0
+    
+    indices = raw - 1
+    
+    if relative.any():
+        # Negative indices count back from the last element defined above the face
+        defined_before = np.cumsum(kinds == kind)[kinds == _FACE]
+        indices[relative] = raw[relative] + np.repeat(defined_before, sizes)[relative]
+    
+    return indices, relative
+
+def _parse_chunk(chunk: bytes):
+    starts, first, kinds = _classify_lines(chunk)
+    
+    if np.any((first == ord(" ")) | (first == ord("\t"))):
+        chunk = _LEADING_BLANKS.sub(b"", chunk)
+        starts, first, kinds = _classify_lines(chunk)
+    
+    counts = {kind: np.count_nonzero(kinds == kind) for kind in (_VERTEX, _TEXTURE, _NORMAL, _FACE)}
+    
+    v = _parse_floats(_gather_lines(chunk, starts, kinds, _VERTEX), b"v", counts[_VERTEX], 3)
+    vt = _parse_floats(_gather_lines(chunk, starts, kinds, _TEXTURE), b"vt", counts[_TEXTURE], 2)
+    vn = _parse_floats(_gather_lines(chunk, starts, kinds, _NORMAL), b"vn", counts[_NORMAL], 3)
+    
+    face_text = _gather_lines(chunk, starts, kinds, _FACE).replace(b"f", b" ")
+    sizes = _token_counts(face_text)
+    
+    resolved = []
+    for raw, kind in zip(_parse_corners(face_text, int(sizes.sum())), (_VERTEX, _TEXTURE, _NORMAL)):
+        if raw is None:
+            resolved.append((None, None))
         else:
-            pass
+            resolved.append(_resolve_indices(raw, kinds, kind, sizes))
+    
+    (indices, relative), (texture_indices, texture_relative), (normal_indices, normal_relative) = resolved
+    
+    groups = []
+    faces_before = np.cumsum(kinds == _FACE)
+    
+    for line in np.flatnonzero((kinds == _OTHER) & np.isin(first, tuple(map(ord, "ogu")))).tolist():
+        keyword, _, name = chunk[starts[line]:starts[line + 1]].decode(errors="replace").strip().partition(" ")
+        
+        if keyword in _GROUP_KEYWORDS:
+            groups.append((_GROUP_KEYWORDS[keyword], name.strip(), int(faces_before[line])))
+    
+    return _Chunk(
+        v, vt, vn, sizes,
+        indices, texture_indices, normal_indices,
+        (relative, texture_relative, normal_relative),
+        groups,
+    )
+
+def _merge_chunks(chunks: list[_Chunk]):
+    totals = {"v": 0, "vt": 0, "vn": 0, "faces": 0}
+    
+    indices, texture_indices, normal_indices = [], [], []
+    groups = {name: ([], []) for name in _GROUP_KEYWORDS.values()}
+    
+    has_textures = any(chunk.texture_indices is not None for chunk in chunks)
+    has_normals = any(chunk.normal_indices is not None for chunk in chunks)
     
-    return ModelData(v = vertices, f = faces)
+    for chunk in chunks:
+        corner_count = len(chunk.indices)
+        
+        for merged, chunk_indices, relative, total, wanted in (
+            (indices, chunk.indices, chunk.relative[0], totals["v"], True),
+            (texture_indices, chunk.texture_indices, chunk.relative[1], totals["vt"], has_textures),
+            (normal_indices, chunk.normal_indices, chunk.relative[2], totals["vn"], has_normals),
+        ):
+            if not wanted:
+                continue
+            if chunk_indices is None:
+                merged.append(np.full(corner_count, -1, dtype=np.int32))
+                continue
             
+            if relative.any():
+                chunk_indices[relative] += total
             
+            merged.append(chunk_indices)
+        
+        for name, group_name, face in chunk.groups:
+            groups[name][0].append(group_name)
+            groups[name][1].append(face + totals["faces"])
+        
+        totals["v"] += len(chunk.v)
+        totals["vt"] += len(chunk.vt)
+        totals["vn"] += len(chunk.vn)
+        totals["faces"] += len(chunk.sizes)
+    
+    sizes = [chunk.sizes for chunk in chunks]
+    
+    offsets = np.zeros(totals["faces"] + 1, dtype=np.int64)
+    np.cumsum(np.concatenate([np.zeros(0, dtype=np.int64), *sizes]), out=offsets[1:])
+    
+    def concatenate(arrays: list[np.ndarray], empty: np.ndarray):
+        return np.concatenate([empty, *arrays])
+    
+    return PackedModelData(
+        v = concatenate([chunk.v for chunk in chunks], np.zeros((0, 3), dtype=np.float32)),
+        indices = concatenate(indices, np.zeros(0, dtype=np.int32)),
+        offsets = offsets,
+        vt = concatenate([chunk.vt for chunk in chunks], np.zeros((0, 2), dtype=np.float32)) if totals["vt"] else None,
+        vn = concatenate([chunk.vn for chunk in chunks], np.zeros((0, 3), dtype=np.float32)) if totals["vn"] else None,
+        texture_indices = concatenate(texture_indices, np.zeros(0, dtype=np.int32)) if has_textures else None,
+        normal_indices = concatenate(normal_indices, np.zeros(0, dtype=np.int32)) if has_normals else None,
+        **{
+            name: FaceGroups(names, np.array(starts, dtype=np.int64)) if names else None
+            for name, (names, starts) in groups.items()
+        },
+    )
+
+def _parse_range(path: str, start: int, end: int):
+    return [_parse_chunk(chunk) for chunk in _read_chunks(path, start=start, end=end)]
+
+
+# Parallel parsing
+def _line_aligned_ranges(path: str, count: int):
+    size = os.path.getsize(path)
+    bounds = [0]
+    
+    with open(path, "rb") as file:
+        for i in range(1, count):
+            file.seek(max(size * i // count - 1, bounds[-1]))
+            file.readline()
             
+            bounds.append(min(file.tell(), size))
+    
+    bounds.append(size)
+    
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+def _parse_obj_data(path: str, workers: int = 1):
+    if workers <= 1:
+        return _merge_chunks(_parse_range(path, 0, os.path.getsize(path)))
+    
+    # Imported here, the process pool machinery is a noticeable part of importing this module
+    from concurrent.futures import ProcessPoolExecutor
+    
+    # A few ranges per worker keeps the pool busy when some ranges are slower (faces vs vertices)
+    range_count = max(1, min(workers * 4, os.path.getsize(path) // MIN_RANGE_SIZE))
+    ranges = _line_aligned_ranges(path, range_count)
+    
+    with ProcessPoolExecutor(workers) as pool:
+        results = pool.map(_parse_range, repeat(path), *zip(*ranges))
+        
+        return _merge_chunks([chunk for chunks in results for chunk in chunks])
+
 
+# Binary cache
+def _cache_path(path: str):
+    return os.path.join(CACHE_DIR, hashlib.sha1(os.path.abspath(path).encode()).hexdigest())
+
+def _cache_key(path: str):
+    stat = os.stat(path)
+    
+    return np.array((CACHE_VERSION, stat.st_mtime_ns, stat.st_size), dtype=np.int64)
+
+def _load_cache(path: str, mmap: bool):
+    cache_path = _cache_path(path)
+    
+    try:
+        if not np.array_equal(np.load(os.path.join(cache_path, "key.npy")), _cache_key(path)):
+            return None
+        
+        return PackedModelData.load(cache_path, mmap)
+    except (OSError, ValueError):
+        # Missing, damaged or incomplete (FileNotFoundError from load) caches are all misses
+        return None
+
+def _save_cache(path: str, data: PackedModelData):
+    cache_path = _cache_path(path)
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    
+    try:
+        data.save(temp_path)
+        np.save(os.path.join(temp_path, "key.npy"), _cache_key(path))
+        
+        shutil.rmtree(cache_path, ignore_errors=True)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        shutil.rmtree(temp_path, ignore_errors=True)
+
+
+def parse_obj(path: str, use_cache: bool = True, mmap: bool = True, workers: int = 1):
+    data = _load_cache(path, mmap) if use_cache else None
+    
+    if data is None:
+        data = _parse_obj_data(path, workers)
+        
+        if use_cache:
+            _save_cache(path, data)
+    
+    return data
+
+
+# Binary formats, records are read straight from the mapped file
+_PLY_TYPES = {
+    "char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1",
+    "short": "i2", "int16": "i2", "ushort": "u2", "uint16": "u2",
+    "int": "i4", "int32": "i4", "uint": "u4", "uint32": "u4",
+    "float": "f4", "float32": "f4", "double": "f8", "float64": "f8",
+}
+_PLY_FORMATS = {"binary_little_endian": "<", "binary_big_endian": ">"}
+_STL_RECORD = np.dtype([("normal", "<f4", 3), ("v", "<f4", (3, 3)), ("attribute", "<u2")])
+
+def _file_buffer(path: str, mmap: bool):
+    if mmap and os.path.getsize(path):
+        return np.memmap(path, dtype=np.uint8, mode="r")
+    
+    with open(path, "rb") as file:
+        return np.frombuffer(file.read(), dtype=np.uint8)
+
+def _ply_header(buffer: np.ndarray):
+    # [(element name, count, [(property name, type, list count type or None)])], byte order and header size
+    end = bytes(buffer[:1 << 16]).find(b"end_header")
+    if not bytes(buffer[:3]) == b"ply" or end < 0:
+        raise ValueError("Not a PLY file")
+    
+    header_size = end + bytes(buffer[end:end + 12]).find(b"\n") + 1
+    elements, order = [], None
+    
+    for line in bytes(buffer[:end]).decode("ascii").splitlines():
+        words = line.split()
+        
+        if not words:
+            continue
+        if words[0] == "format":
+            if words[1] not in _PLY_FORMATS:
+                raise ValueError(f"Unsupported PLY format '{words[1]}', only binary PLY is read")
+            order = _PLY_FORMATS[words[1]]
+        elif words[0] == "element":
+            elements.append((words[1], int(words[2]), []))
+        elif words[0] == "property" and words[1] == "list":
+            elements[-1][2].append((words[4], _PLY_TYPES[words[3]], _PLY_TYPES[words[2]]))
+        elif words[0] == "property":
+            elements[-1][2].append((words[2], _PLY_TYPES[words[1]], None))
+    
+    if order is None:
+        raise ValueError("PLY file has no format")
+    
+    return elements, order, header_size
+
+def _ply_record_type(properties: list, order: str, length: int = 0):
+    # Records with every list holding length values
+    fields = []
+    for name, value_type, count_type in properties:
+        if count_type is None:
+            fields.append((name, order + value_type))
+        else:
+            fields += [(f"{name}_count", order + count_type), (name, order + value_type, (length,))]
+    
+    return np.dtype(fields)
+
+def _unaligned(buffer: np.ndarray, offset: int, dtype: np.dtype):
+    # A value of dtype starting at every byte from offset on
+    return np.ndarray((max(len(buffer) - offset - dtype.itemsize + 1, 0),), dtype, buffer, offset, (1,))
+
+def _ply_records(buffer: np.ndarray, offset: int, count: int, properties: list, order: str):
+    # Records of an element without list properties, and the offset after the last one
+    dtype = _ply_record_type(properties, order)
+    
+    if offset + count * dtype.itemsize > len(buffer):
+        raise ValueError("PLY file ends early")
+    
+    return np.frombuffer(buffer, dtype, count, offset), offset + count * dtype.itemsize
+
+def _ply_lists(buffer: np.ndarray, offset: int, count: int, properties: list, order: str):
+    # The list of every record as (values, offsets), and the offset after the last record. Other properties
+    # of the records are skipped
+    lists = [i for i, (_, _, count_type) in enumerate(properties) if count_type is not None]
+    
+    if len(lists) > 1:
+        raise ValueError("PLY elements with more than one list property are not supported")
+    
+    name, value_type, count_type = properties[lists[0]]
+    value_type, count_type = np.dtype(order + value_type), np.dtype(order + count_type)
+    
+    # Where the list's length sits in a record, and the bytes of a record besides its list values
+    empty_record = _ply_record_type(properties, order)
+    count_offset, fixed_size = empty_record.fields[f"{name}_count"][1], empty_record.itemsize
+    
+    if not count:
+        return (np.zeros(0, dtype=value_type), np.zeros(1, dtype=np.int64)), offset
+    if offset + count_offset + count_type.itemsize > len(buffer):
+        raise ValueError("PLY file ends early")
+    
+    # Most meshes have one polygon size. The records are checked against the first one's length in growing
+    # windows, so that a different length is found early, and then read as one array
+    length = int(np.frombuffer(buffer, count_type, 1, offset + count_offset)[0])
+    dtype = _ply_record_type(properties, order, length)
+    
+    checked, window = 0, 1024
+    while checked < count:
+        window = min(window, count - checked)
+        if offset + (checked + window) * dtype.itemsize > len(buffer):
+            break
+        
+        if (np.frombuffer(buffer, dtype, window, offset + checked * dtype.itemsize)[f"{name}_count"] != length).any():
+            break
+        
+        checked += window
+        window *= 2
+    
+    if checked == count:
+        values = np.frombuffer(buffer, dtype, count, offset)[name].reshape(-1)
+        
+        return (values, np.arange(count + 1, dtype=np.int64) * length), offset + count * dtype.itemsize
+    
+    # Mixed lengths: every byte of the block is taken as a possible record start, with the next record
+    # starting fixed_size + length * value size bytes on. The chain from the first record is followed by
+    # pointer doubling in log2(count) passes, positions past the end of the block lead to size
+    size = min(len(buffer) - offset, count * (fixed_size + int(np.iinfo(count_type).max) * value_type.itemsize))
+    index_type = np.int32 if size * (value_type.itemsize + 1) + fixed_size < 1 << 31 else np.int64
+    
+    # Lengths no block could hold are cut down first so the sums below fit in index_type
+    lengths = _unaligned(buffer, offset + count_offset, count_type)[:size]
+    lengths = np.minimum(lengths, min(size, int(np.iinfo(count_type).max))).astype(index_type)
+    
+    ends = lengths * value_type.itemsize
+    ends += np.arange(fixed_size, fixed_size + len(lengths), dtype=index_type)
+    if count_type.kind == "i":
+        ends[lengths < 0] = size
+    
+    jump = np.full(size + 1, size, dtype=index_type)
+    np.minimum(ends, size, out=jump[:len(lengths)])
+    del ends
+    
+    # After each pass jump skips twice as many records and starts holds twice as many of them. Chains from
+    # neighbouring bytes soon merge, so only positions some jump lands on or a record starts at are kept
+    # for the next pass, jump and starts then index into positions. These shrink to about count
+    positions = np.arange(size + 1, dtype=index_type)
+    starts = np.zeros(1, dtype=index_type)
+    while len(starts) < count:
+        starts = np.concatenate((starts, jump[starts]))
+        jump = jump[jump]
+        
+        kept = np.zeros(len(positions), dtype=bool)
+        kept[jump] = True
+        kept[starts] = True
+        kept = np.flatnonzero(kept)
+        
+        # Only entries that are kept are ever looked up
+        renumber = np.empty(len(positions), dtype=index_type)
+        renumber[kept] = np.arange(len(kept), dtype=index_type)
+        
+        positions, jump, starts = positions[kept], renumber[jump[kept]], renumber[starts]
+    starts = positions[starts[:count]].astype(np.int64)
+    
+    if starts[-1] >= len(lengths) or starts[-1] + fixed_size + lengths[starts[-1]] * value_type.itemsize > size:
+        raise ValueError("PLY file ends early")
+    
+    record_lengths = lengths[starts]
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(record_lengths, out=offsets[1:])
+    
+    # Byte position of every value, then all of them are read with one gather
+    first_value = starts + count_offset + count_type.itemsize
+    positions = np.repeat(first_value - offsets[:-1] * value_type.itemsize, record_lengths) + np.arange(offsets[-1]) * value_type.itemsize
+    values = _unaligned(buffer, offset, value_type)[positions]
+    
+    return (values, offsets), offset + int(starts[-1] + fixed_size + record_lengths[-1] * value_type.itemsize)
+
+def _ply_columns(records: np.ndarray, names: tuple[str, ...]):
+    if not all(name in records.dtype.names for name in names):
+        return None
+    
+    # Tightly packed float32 in the file's byte order is used as is, anything else is converted once
+    if records.dtype.names[:len(names)] == names and records.dtype.itemsize == 4 * len(names) and all(records.dtype[name] == np.float32 for name in names):
+        return records.view(np.float32).reshape(-1, len(names))
+    
+    return np.column_stack([records[name] for name in names]).astype(np.float32)
+
+def parse_ply(path: str, mmap: bool = True):
+    buffer = _file_buffer(path, mmap)
+    elements, order, offset = _ply_header(buffer)
+    
+    vertices = None
+    indices, offsets = np.zeros(0, dtype=np.int32), np.zeros(1, dtype=np.int64)
+    
+    for element, count, properties in elements:
+        if not any(count_type for _, _, count_type in properties):
+            records, offset = _ply_records(buffer, offset, count, properties, order)
+            
+            if element == "vertex":
+                vertices = records
+            continue
+        
+        (values, value_offsets), offset = _ply_lists(buffer, offset, count, properties, order)
+        
+        if element == "face":
+            if not any(count_type and name in ("vertex_indices", "vertex_index") for name, _, count_type in properties):
+                raise ValueError("PLY faces have no vertex_indices")
+            
+            indices, offsets = values.astype(np.int32), value_offsets
+    
+    if vertices is None:
+        raise ValueError("PLY file has no vertex element")
+    
+    normals = _ply_columns(vertices, ("nx", "ny", "nz"))
+    textures = _ply_columns(vertices, ("s", "t")) if "s" in vertices.dtype.names else _ply_columns(vertices, ("u", "v"))
+    
+    return PackedModelData(
+        v = _ply_columns(vertices, ("x", "y", "z")),
+        indices = indices,
+        offsets = offsets,
+        vt = textures,
+        vn = normals,
+        # Per vertex attributes, every corner uses those of its own vertex
+        texture_indices = indices if textures is not None else None,
+        normal_indices = indices if normals is not None else None,
+    )
+
+def _position_keys(corners: np.ndarray):
+    # 64 bit hash of the bits of every position, equal positions always get equal keys
+    bits = corners.view(np.uint32).astype(np.uint64)
+    
+    return (bits[:, 0] * np.uint64(0x9E3779B97F4A7C15)) ^ (bits[:, 1] * np.uint64(0xC2B2AE3D27D4EB4F)) ^ (bits[:, 2] * np.uint64(0x165667B19E3779F9))
+
+def weld_vertices(corners: np.ndarray):
+    # Corners at the same position become one vertex, numbered in order of first use. Returns (vertices,
+    # index of every corner). Positions are compared bit for bit with -0.0 folded into 0.0
+    corners = np.ascontiguousarray(corners + np.float32(0), dtype=np.float32)
+    
+    for keys in (_position_keys(corners), corners.view(np.dtype((np.void, 12))).ravel()):
+        # A stable sort keeps the first use of every key at the front of its run
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        
+        starts = np.ones(len(keys), dtype=bool)
+        starts[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        first = order[starts]
+        
+        rank = np.empty(len(first), dtype=np.int32)
+        rank[np.argsort(first)] = np.arange(len(first), dtype=np.int32)
+        
+        indices = np.empty(len(keys), dtype=np.int32)
+        indices[order] = rank[np.cumsum(starts) - 1]
+        
+        vertices = corners[np.sort(first)]
+        
+        # Hash collisions merge different positions, those are caught here and welded again by the exact bytes
+        if np.array_equal(vertices[indices], corners):
+            break
+    
+    return vertices, indices
+
+def parse_stl(path: str, mmap: bool = True):
+    buffer = _file_buffer(path, mmap)
+    
+    count = int(np.frombuffer(buffer, "<u4", 1, 80)[0]) if len(buffer) >= 84 else -1
+    if len(buffer) != 84 + count * _STL_RECORD.itemsize:
+        raise ValueError("Not a binary STL file, ASCII STL is not supported")
+    
+    triangles = np.frombuffer(buffer, _STL_RECORD, count, 84)
+    vertices, indices = weld_vertices(triangles["v"].reshape(-1, 3))
+    
+    return PackedModelData(
+        v = vertices,
+        indices = indices,
+        offsets = np.arange(0, 3 * count + 1, 3, dtype=np.int64),
+        # Facet normals, shared by the three corners of their triangle
+        vn = triangles["normal"].astype(np.float32),
+        normal_indices = np.repeat(np.arange(count, dtype=np.int32), 3),
+    )
+
+def parse_model(path: str, use_cache: bool = True, mmap: bool = True, workers: int = 1):
+    # Picks the parser from the file extension, anything unknown is read as OBJ
+    extension = os.path.splitext(path)[1].lower()
+    
+    if extension == ".ply":
+        return parse_ply(path, mmap)
+    if extension == ".stl":
+        return parse_stl(path, mmap)
+    
+    return parse_obj(path, use_cache, mmap, workers)
+
+
+
+# Progressive loading
+def stream_obj(path: str, chunk_size: int = STREAM_CHUNK_SIZE):
+    # Yields (batch, bytes read so far) for every chunk of the file as soon as it is parsed. Batches are
+    # PackedModelData whose indices count from the first vertex of the file, not of the batch
+    totals = [0, 0, 0]
+    read = 0
+    
+    for chunk in _read_chunks(path, chunk_size):
+        read += len(chunk)
+        parsed = _parse_chunk(chunk)
+        
+        for i, (indices, relative) in enumerate(zip((parsed.indices, parsed.texture_indices, parsed.normal_indices), parsed.relative)):
+            if indices is not None and relative.any():
+                indices[relative] += totals[i]
+                relative[:] = False
+        
+        totals[0] += len(parsed.v)
+        totals[1] += len(parsed.vt)
+        totals[2] += len(parsed.vn)
+        
+        yield _merge_chunks([parsed]), read
+
+class ObjStream:
+    # stream_obj on a background thread, poll hands over the batches parsed so far without ever waiting for one
+    def __init__(self, path: str, chunk_size: int = STREAM_CHUNK_SIZE):
+        self.size = max(os.path.getsize(path), 1)
+        self.progress = 0.0
+        self.done = False
+        
+        self._batches = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._load, args=(path, chunk_size), daemon=True)
+        self._thread.start()
+    
+    def _load(self, path: str, chunk_size: int):
+        try:
+            for batch, read in stream_obj(path, chunk_size):
+                self._batches.put((batch, read))
+        except Exception as error:
+            self._batches.put(error)
+        else:
+            self._batches.put(None)
+    
+    def poll(self):
+        batches = []
+        
+        while not self.done:
+            try:
+                item = self._batches.get_nowait()
+            except queue.Empty:
+                break
+            
+            if isinstance(item, Exception):
+                self.done = True
+                raise item
+            
+            if item is None:
+                self.done = True
+                self.progress = 1.0
+            else:
+                batch, read = item
+                batches.append(batch)
+                # The last line may have had a newline added
+                self.progress = min(read / self.size, 1.0)
+        
+        return batches
@@ -0,0 +1,174 @@
+import math
+
+import numpy as np
+
+from constants import NEAR_PLANE, PICK_CELL_SIZE, PICK_DEPTH_TOLERANCE
+from culling import CLIPPED_NEAR_PLANE, clip_triangles, visible_points
+from point_data import Transforms
+
+
+class ScreenGrid:
+    # Uniform grid of square cells over the screen holding item numbers. The contents of every cell are stored
+    # back to back in row major cell order, so a run of cells along a row is one slice
+    def __init__(self, width: int, height: int, cell_size: int = PICK_CELL_SIZE):
+        # Cell numbers are kept to 16 bits, numpy sorts those with a linear time radix sort
+        cell_size = max(cell_size, math.ceil(math.sqrt(width * height / (1 << 16))))
+        while math.ceil(width / cell_size) * math.ceil(height / cell_size) > 1 << 16:
+            cell_size += 1
+        
+        self.cell_size = cell_size
+        self.columns = max(math.ceil(width / cell_size), 1)
+        self.rows = max(math.ceil(height / cell_size), 1)
+        
+        self.starts = np.zeros(self.columns * self.rows + 1, dtype=np.int64)
+        self.items = np.zeros(0, dtype=np.intp)
+    
+    def cells(self, x: np.ndarray, y: np.ndarray):
+        # Column and row of every point, clamped to the grid. Clamping first lets truncation stand in for floor
+        scale = 1 / self.cell_size
+        
+        return np.clip(x * scale, 0, self.columns - 1).astype(np.int32), np.clip(y * scale, 0, self.rows - 1).astype(np.int32)
+    
+    def fill(self, cells: np.ndarray, items: np.ndarray):
+        order = np.argsort(cells.astype(np.uint16), kind="stable")
+        
+        self.items = items[order]
+        np.cumsum(np.bincount(cells, minlength=len(self.starts) - 1), out=self.starts[1:])
+    
+    def query(self, x_min: float, y_min: float, x_max: float, y_max: float):
+        # Items of every cell the box overlaps, an item may be returned more than once
+        (column, last_column), (row, last_row) = (cells.tolist() for cells in self.cells(np.array((x_min, x_max)), np.array((y_min, y_max))))
+        
+        return np.concatenate([self.items[0:0], *(
+            self.items[self.starts[r * self.columns + column]:self.starts[r * self.columns + last_column + 1]]
+            for r in range(row, last_row + 1)
+        )])
+
+class PickingGrid:
+    # What is under a point of the screen for one projection of a mesh. Vertices are binned into a grid when it
+    # is made, triangles only the first time a face is picked
+    def __init__(self, clip: np.ndarray, points: np.ndarray, triangles: tuple, width: int, height: int, back_faces: bool):
+        self.clip = clip
+        self.points = points
+        self.depth = depth = clip[:, 2]
+        self.triangles = triangles
+        self.size = width, height
+        self.back_faces = back_faces
+        
+        visible = np.flatnonzero(visible_points(points, depth, width, height))
+        
+        self.vertex_grid = ScreenGrid(width, height)
+        columns, rows = self.vertex_grid.cells(points[visible, 0], points[visible, 1])
+        self.vertex_grid.fill(rows * self.vertex_grid.columns + columns, visible)
+        
+        self._face_grid = None
+        # (points, depth, triangles, faces) the face grid was made from
+        self._faces = None
+    
+    def vertex(self, x: float, y: float, radius: float, depth_buffer: np.ndarray | None = None):
+        # Nearest vertex within radius pixels of (x, y), the one nearer the camera on ties, or None. Vertices
+        # behind a depth buffer of 1 / z values (x major, like the rasterizer's) are skipped
+        candidates = self.vertex_grid.query(x - radius, y - radius, x + radius, y + radius)
+        distances = np.hypot(self.points[candidates, 0] - x, self.points[candidates, 1] - y)
+        
+        seen = distances <= radius
+        if depth_buffer is not None and depth_buffer.shape == self.size:
+            pixels = np.minimum(self.points[candidates].astype(np.int64), np.array(self.size) - 1)
+            seen &= 1 / self.depth[candidates] >= depth_buffer[pixels[:, 0], pixels[:, 1]] * (1 - PICK_DEPTH_TOLERANCE)
+        
+        if not seen.any():
+            return None
+        
+        candidates, distances = candidates[seen], distances[seen]
+        
+        return int(candidates[np.lexsort((self.depth[candidates], distances))[0]])
+    
+    @property
+    def face_grid(self):
+        # Every triangle that would be filled is listed in each cell its screen bounding box overlaps. Same
+        # rules as clip_triangles, cull_triangles and the rasterizer, worked out from single precision
+        # coordinates per axis since this runs over every triangle whenever the model moves
+        if self._face_grid is None:
+            triangles, faces, _ = self.triangles
+            points, depth = self.points, self.depth
+            width, height = self.size
+            
+            # One row per corner, reducing over three rows is far quicker than over a short last axis
+            z = depth.astype(np.float32)[triangles.T]
+            low_z = np.minimum(np.minimum(z[0], z[1]), z[2])
+            
+            # Triangles reaching behind the near plane are cut at it as they are for drawing, the new corners go after the vertices
+            crossing = np.flatnonzero(low_z <= NEAR_PLANE)
+            crossing = crossing[np.maximum(np.maximum(z[0, crossing], z[1, crossing]), z[2, crossing]) > NEAR_PLANE]
+            if len(crossing):
+                clip, cut, source = clip_triangles(self.clip, triangles[crossing])
+                
+                points = np.concatenate((points, Transforms.project_array(clip[len(points):])[0]))
+                depth = clip[:, 2]
+                
+                whole = low_z > NEAR_PLANE
+                triangles = np.concatenate((triangles[whole], cut))
+                faces = np.concatenate((faces[whole], faces[crossing][source]))
+                
+                z = depth.astype(np.float32)[triangles.T]
+                low_z = np.minimum(np.minimum(z[0], z[1]), z[2])
+            
+            self._faces = points, depth, triangles, faces
+            
+            (x0, x1, x2), (y0, y1, y2) = (values.astype(np.float32)[triangles.T] for values in points.T)
+            
+            area = (x1 - x0) * (y2 - y0) - (x2 - x0) * (y1 - y0)
+            low_x, high_x = np.minimum(np.minimum(x0, x1), x2), np.maximum(np.maximum(x0, x1), x2)
+            low_y, high_y = np.minimum(np.minimum(y0, y1), y2), np.maximum(np.maximum(y0, y1), y2)
+            
+            drawn = (
+                ((area > 0) if self.back_faces else (area != 0))
+                & (low_z > CLIPPED_NEAR_PLANE)
+                & (high_x >= 0) & (low_x <= width) & (high_y >= 0) & (low_y <= height)
+            )
+            drawn = np.flatnonzero(drawn)
+            
+            grid = ScreenGrid(width, height)
+            columns, rows = grid.cells(low_x[drawn], low_y[drawn])
+            last_columns, last_rows = grid.cells(high_x[drawn], high_y[drawn])
+            
+            widths = last_columns - columns + 1
+            counts = widths * (last_rows - rows + 1)
+            cells = rows * grid.columns + columns
+            
+            # Most triangles sit in one cell, only the others are spread over theirs
+            spread = np.flatnonzero(counts > 1)
+            owner = np.repeat(spread, counts[spread])
+            local = np.arange(len(owner)) - np.repeat(np.cumsum(counts[spread]) - counts[spread], counts[spread])
+            
+            grid.fill(
+                np.concatenate((cells[counts == 1], cells[owner] + local // widths[owner] * grid.columns + local % widths[owner])),
+                np.concatenate((drawn[counts == 1], drawn[owner])),
+            )
+            self._face_grid = grid
+        
+        return self._face_grid
+    
+    def face(self, x: float, y: float):
+        # Face of the nearest filled triangle covering (x, y), or None
+        candidates = self.face_grid.query(x, y, x, y)
+        points, depth, triangles, faces = self._faces
+        triangles = triangles[candidates]
+        
+        (x0, x1, x2), (y0, y1, y2) = points[triangles].transpose(2, 1, 0)
+        area = (x1 - x0) * (y2 - y0) - (x2 - x0) * (y1 - y0)
+        
+        # Barycentric weights, none negative inside the triangle
+        w0 = ((x1 - x) * (y2 - y) - (x2 - x) * (y1 - y)) / area
+        w1 = ((x2 - x) * (y0 - y) - (x0 - x) * (y2 - y)) / area
+        w2 = 1 - w0 - w1
+        
+        inside = (w0 >= 0) & (w1 >= 0) & (w2 >= 0)
+        if not inside.any():
+            return None
+        
+        # 1 / z is affine on the screen, the largest is the nearest
+        d0, d1, d2 = (1 / depth[triangles[inside]]).T
+        nearest = np.argmax(w0[inside] * d0 + w1[inside] * d1 + w2[inside] * d2)
+        
+        return int(faces[candidates[inside][nearest]])
@@ -0,0 +1,73 @@
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from models import BaseModel, Projection
+
+
+def _project(projection: Projection, clip: np.ndarray, points: np.ndarray):
+    # Runs on the worker, returns the projection with the time spent transforming and dividing
+    start = time.perf_counter()
+    projection.transform(clip)
+    
+    middle = time.perf_counter()
+    projection.project(points)
+    
+    return projection, middle - start, time.perf_counter() - middle
+
+class ProjectionPipeline:
+    # Projects the model's next frame on a worker thread while the calling thread draws the current one,
+    # numpy releases the GIL for the whole projection. Consecutive projections alternate between two pairs of
+    # buffers so the worker never writes into arrays that are being drawn. Frames are shown one frame after
+    # they were simulated
+    def __init__(self, model: BaseModel):
+        self.model = model
+        
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="projection")
+        self._buffers: list[tuple[np.ndarray, np.ndarray] | None] = [None, None]
+        self._next = 0
+        
+        self._submitted: Projection | None = None
+        self._pending: Future | None = None
+        self._latest: Projection | None = None
+    
+    def _buffer(self, count: int):
+        buffer = self._buffers[self._next]
+        
+        if buffer is None or len(buffer[0]) != count:
+            buffer = self._buffers[self._next] = np.empty((count, 3)), np.empty((count, 2))
+        
+        self._next ^= 1
+        
+        return buffer
+    
+    def submit(self, display_flag: int):
+        # Starts projecting the model as it is now, a frame identical to the last one submitted is not redone.
+        # Must follow collect, the buffers it writes into are the ones drawn two frames ago
+        projection = self.model.prepare_projection(display_flag)
+        submitted = self._submitted
+        
+        if submitted is not None and projection.state == submitted.state and projection.mesh is submitted.mesh:
+            return
+        
+        self._submitted = projection
+        self._pending = self._executor.submit(_project, projection, *self._buffer(len(projection.mesh.vertices)))
+    
+    def collect(self):
+        # The most recent finished projection, waiting for the one in flight. None until the first is done
+        if self._pending is not None:
+            profiler = self.model.profiler
+            
+            with profiler.stage("wait"):
+                self._latest, transform, projection = self._pending.result()
+            
+            profiler.record("transform", transform)
+            profiler.record("projection", projection)
+            
+            self._pending = None
+        
+        return self._latest
+    
+    def close(self):
+        self._executor.shutdown()
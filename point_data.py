@@ -1,9 +1,18 @@
 from dataclasses import dataclass
+from functools import reduce
+from typing import TYPE_CHECKING
 import math
-import pygame
+import numpy as np
 from constants import Number
 
+# Only a surface's size is ever read here, so scripts doing maths alone never load pygame
+if TYPE_CHECKING:
+    import pygame
+
 class Vector:
+    # Components live in slots rather than a per instance __dict__
+    __slots__ = ("x", "y")
+    
     def __init__(self, x: Number, y: Number):
         self.x = x
         self.y = y
@@ -19,8 +28,11 @@ class Vector:
 
 
 class Vec2(Vector):
+    __slots__ = ("at_infinity",)
+    
     def __init__(self, x, y):
-        super().__init__(x, y)
+        self.x = x
+        self.y = y
         
         self.at_infinity = False
     
@@ -57,7 +69,9 @@ class Vec2(Vector):
      
     def __sub__(self, other):
         if not self.at_infinity:
-            if isinstance(other, (Vec2, int, float)):
+            if type(other) is Vec2:
+                return Vec2(self.x - other.x, self.y - other.y)
+            elif isinstance(other, (Vec2, int, float)):
                 return self.__add__(other * -1)
             elif isinstance(other, tuple | list):
                 if len(other) != 2:
@@ -75,10 +89,41 @@ class Vec2(Vector):
     def __rmul__(self, other):
         return self.__mul__(other)
     
+    # In place operators update this vector instead of allocating a new one, a point at infinity stays there
+    def __iadd__(self, other):
+        if not self.at_infinity:
+            if type(other) is Vec2:
+                self.x += other.x
+                self.y += other.y
+            else:
+                self.x, self.y = self.__add__(other)
+        
+        return self
+    
+    def __isub__(self, other):
+        if not self.at_infinity:
+            if type(other) is Vec2:
+                self.x -= other.x
+                self.y -= other.y
+            else:
+                self.x, self.y = self.__sub__(other)
+        
+        return self
+    
+    def __imul__(self, other):
+        if not self.at_infinity:
+            if isinstance(other, (int, float)):
+                self.x *= other
+                self.y *= other
+            else:
+                self.x, self.y = self.__mul__(other)
+        
+        return self
+    
     def __repr__(self):
         return f"Vec2({self.x if self.x is not None else "Inf"}, {self.y if self.y is not None else "Inf"})"
 
-    def project(self, screen: pygame.Surface):
+    def project(self, screen: "pygame.Surface"):
         if self.at_infinity:
             return self
         return Vec2((self.x + 1) * screen.get_width() / 2, (1 - self.y) * screen.get_height() / 2)
@@ -90,35 +135,12 @@ class Vec2(Vector):
         return self.x * vec.x + self.y * vec.y
 
 class Vec3(Vector):
-    def __init__(self, x: Number, y: Number, z: Number):
-        self._x = x
-        self._y = y
-        self._z = z
-        
-        super().__init__(self._x, self._y)
-        
-        self.z = self._z
-    
-    @property
-    def x(self):
-        return self._x
-    @x.setter
-    def x(self, value: Number):
-        self._x = value
+    __slots__ = ("z",)
     
-    @property
-    def y(self):
-        return self._y
-    @y.setter
-    def y(self, value: Number):
-        self._y = value
-    
-    @property
-    def z(self):
-        return self._z
-    @z.setter
-    def z(self, value: Number):
-        self._z = value
+    def __init__(self, x: Number, y: Number, z: Number):
+        self.x = x
+        self.y = y
+        self.z = z
     
     # --- Iterator Overloading ---
     def __getitem__(self, index: int):
@@ -138,24 +160,33 @@ class Vec3(Vector):
         return iter((self.x, self.y, self.z))
     
     # --- Arithmetic Overloading ---
+    # Same type operands are checked first, they are the common case
     def __add__(self, other):
-        if isinstance(other, Vec2):
+        cls = type(self)
+        
+        if type(other) is cls:
+            return cls(self.x + other.x, self.y + other.y, self.z + other.z)
+        elif isinstance(other, Vec2):
             return Vec3(self.x + other.x, self.y + other.y, self.z)
-        elif isinstance(other, self.__class__):
-            return self.__class__(self.x + other.x, self.y + other.y, self.z + other.z)
+        elif isinstance(other, cls):
+            return cls(self.x + other.x, self.y + other.y, self.z + other.z)
         elif isinstance(other, tuple | list):
             if len(other) != 3:
                 raise ValueError("Tuple must have 3 elements")
-            return self.__class__(self.x + other[0], self.y + other[1], self.z + other[2])
+            return cls(self.x + other[0], self.y + other[1], self.z + other[2])
         elif isinstance(other, (int, float)):
-            return self.__class__(self.x + other, self.y + other, self.z + other)
+            return cls(self.x + other, self.y + other, self.z + other)
         
         raise NotImplementedError(f"Cannot not add Vec3 to '{other.__class__.__name__}'")
     def __radd__(self, other):
         return self.__add__(other)
      
     def __sub__(self, other):
-        if isinstance(other, (Vec2, self.__class__, int, float)):
+        cls = type(self)
+        
+        if type(other) is cls:
+            return cls(self.x - other.x, self.y - other.y, self.z - other.z)
+        elif isinstance(other, (Vec2, cls, int, float)):
             return self.__add__(other * -1)
         elif isinstance(other, tuple | list):
             if len(other) != 3:
@@ -165,15 +196,48 @@ class Vec3(Vector):
         raise NotImplementedError(f"Cannot not subtract '{other.__class__.__name__}' from Vec3")
     
     def __mul__(self, other):
-        if isinstance(other, self.__class__):
-            return self.__class__(self.x * other.x, self.y * other.y, self.z * other.z)
-        elif isinstance(other, (int, float)):
-            return self.__class__(self.x * other, self.y * other, self.z * other)
+        cls = type(self)
+        
+        if isinstance(other, (int, float)):
+            return cls(self.x * other, self.y * other, self.z * other)
+        elif isinstance(other, cls):
+            return cls(self.x * other.x, self.y * other.y, self.z * other.z)
         
         raise NotImplementedError(f"Cannot not multiply Vec3 with '{other.__class__.__name__}'")
     def __rmul__(self, other):
         return self.__mul__(other)
     
+    # In place operators update this vector instead of allocating a new one
+    def __iadd__(self, other):
+        if type(other) is type(self):
+            self.x += other.x
+            self.y += other.y
+            self.z += other.z
+        else:
+            self.x, self.y, self.z = self.__add__(other)
+        
+        return self
+    
+    def __isub__(self, other):
+        if type(other) is type(self):
+            self.x -= other.x
+            self.y -= other.y
+            self.z -= other.z
+        else:
+            self.x, self.y, self.z = self.__sub__(other)
+        
+        return self
+    
+    def __imul__(self, other):
+        if isinstance(other, (int, float)):
+            self.x *= other
+            self.y *= other
+            self.z *= other
+        else:
+            self.x, self.y, self.z = self.__mul__(other)
+        
+        return self
+    
     def __repr__(self):
         return f"{self.__class__.__name__}({self.x}, {self.y}, {self.z})"
 
@@ -192,47 +256,29 @@ class Vec3(Vector):
         return self.x * vec.x + self.y * vec.y + self.z * vec.z
 
 class AngleVec3(Vec3):
+    # The rotation planes are names for the same three slots
+    __slots__ = ()
+    
     @property
     def xz(self):
-        return self._xz
+        return self.x
     @xz.setter
     def xz(self, value: Number):
         self.x = value
     
     @property
     def yz(self):
-        return self._yz
+        return self.y
     @yz.setter
     def yz(self, value: Number):
         self.y = value
     
     @property
     def xy(self):
-        return self._xy
+        return self.z
     @xy.setter
     def xy(self, value: Number):
         self.z = value
-    
-    @property
-    def x(self):
-        return self._x
-    @x.setter
-    def x(self, value: Number):
-        self._x = self._xz = value
-    
-    @property
-    def y(self):
-        return self._y
-    @y.setter
-    def y(self, value: Number):
-        self._y = self._yz = value
-    
-    @property
-    def z(self):
-        return self._z
-    @z.setter
-    def z(self, value: Number):
-        self._z = self._xy = value
 
 @dataclass
 class Transforms:
@@ -262,5 +308,79 @@ class Transforms:
         )
         
         return Vec3(x_prime3, y_prime3, z_prime3)
-
-
+    
+    # --- Batched (N, 3) array transforms ---
+    def rotation_matrix(angle: AngleVec3):
+        xy, xz, yz = math.radians(angle.xy), math.radians(angle.xz), math.radians(angle.yz)
+        
+        r_xy = np.array((
+            (math.cos(xy), -math.sin(xy), 0),
+            (math.sin(xy),  math.cos(xy), 0),
+            (0,             0,            1),
+        ))
+        r_xz = np.array((
+            (math.cos(xz), 0, -math.sin(xz)),
+            (0,            1,  0),
+            (math.sin(xz), 0,  math.cos(xz)),
+        ))
+        r_yz = np.array((
+            (1,  0,            0),
+            (0,  math.cos(yz), math.sin(yz)),
+            (0, -math.sin(yz), math.cos(yz)),
+        ))
+        
+        return r_yz @ r_xz @ r_xy
+    
+    def project_array(vertices: np.ndarray, out: np.ndarray | None = None):
+        z = vertices[:, 2]
+        at_infinity = z == 0
+        
+        if out is None:
+            out = np.zeros((len(vertices), 2))
+        else:
+            out.fill(0)
+        
+        points = np.divide(vertices[:, :2], z[:, None], out=out, where=~at_infinity[:, None])
+        
+        return points, at_infinity
+    
+    # --- 4x4 homogeneous matrices ---
+    def translation_matrix(offset: Vec3):
+        matrix = np.identity(4)
+        matrix[:3, 3] = offset.coordinates()
+        
+        return matrix
+    
+    def scale_matrix(scale: Vec3):
+        return np.diag((*scale.coordinates(), 1.0))
+    
+    def rotation_matrix4(angle: AngleVec3):
+        matrix = np.identity(4)
+        matrix[:3, :3] = Transforms.rotation_matrix(angle)
+        
+        return matrix
+    
+    def model_matrix(angle: AngleVec3, scale: Vec3, offset: Vec3):
+        # Same order as the per-vertex path: rotate, then scale, then translate
+        return Transforms.translation_matrix(offset) @ Transforms.scale_matrix(scale) @ Transforms.rotation_matrix4(angle)
+    
+    def viewport_matrix(screen: "pygame.Surface"):
+        # Folds Vec2.project into the matrix; the perspective divide by z happens afterwards
+        half_width, half_height = screen.get_width() / 2, screen.get_height() / 2
+        
+        return np.array((
+            (half_width, 0,            half_width,  0),
+            (0,          -half_height, half_height, 0),
+            (0,          0,            1,           0),
+            (0,          0,            0,           1),
+        ))
+    
+    def compose(*matrices: np.ndarray):
+        # Outermost transform first, e.g. compose(viewport, parent, child)
+        return reduce(np.matmul, matrices, np.identity(4))
+    
+    def apply_matrix(vertices: np.ndarray, matrix: np.ndarray, out: np.ndarray | None = None):
+        out = np.matmul(vertices, matrix[:3, :3].T, out=out)
+        out += matrix[:3, 3]
+        
+        return out
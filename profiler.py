@@ -0,0 +1,111 @@
+import csv
+import json
+import os
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from constants import PROFILE_STAGES, PROFILE_WINDOW, PROFILE_PERCENTILES
+
+# Only the overlay draws, with a surface and labels handed in, so profiling headless tools never loads pygame
+if TYPE_CHECKING:
+    import pygame
+    from labels import LabelRenderer
+
+
+class FrameProfiler:
+    # Wall time of every named stage, summed over a frame. The last `window` frames feed the rolling
+    # percentiles, and every frame can be streamed to a CSV or JSON lines trace
+    def __init__(self, window: int = PROFILE_WINDOW, stages: tuple[str, ...] = PROFILE_STAGES):
+        self.stages = stages
+        self.frames: deque[dict[str, float]] = deque(maxlen=window)
+        
+        self._current: dict[str, float] = {}
+        self._frame_start = time.perf_counter()
+        
+        self._trace = None
+        self._trace_writer = None
+    
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+    
+    def record(self, name: str, seconds: float):
+        # For time measured elsewhere, such as on another thread
+        self._current[name] = self._current.get(name, 0) + seconds
+    
+    def end_frame(self):
+        now = time.perf_counter()
+        
+        frame, self._current = self._current, {}
+        frame["frame"] = now - self._frame_start
+        self._frame_start = now
+        
+        self.frames.append(frame)
+        
+        if self._trace_writer is not None:
+            self._trace_writer(frame)
+    
+    def percentiles(self, percentiles: tuple[float, ...] = PROFILE_PERCENTILES):
+        # {stage: [seconds at each percentile]}, stages that never ran in the window are left out
+        names = [name for name in self.stages if any(name in frame for frame in self.frames)]
+        
+        if not names:
+            return {}
+        
+        times = np.array([[frame.get(name, 0) for name in names] for frame in self.frames])
+        
+        return dict(zip(names, np.percentile(times, percentiles, axis=0).T.tolist()))
+    
+    # Trace
+    def open_trace(self, path: str):
+        # .csv gets one column per known stage, anything else is written as one JSON object per line
+        self.close_trace()
+        self._trace = open(path, "w", newline="")
+        
+        if os.path.splitext(path)[1].lower() == ".csv":
+            writer = csv.DictWriter(self._trace, self.stages, restval=0, extrasaction="ignore")
+            writer.writeheader()
+            
+            self._trace_writer = writer.writerow
+        else:
+            self._trace_writer = lambda frame: self._trace.write(json.dumps(frame) + "\n")
+    
+    def close_trace(self):
+        if self._trace is not None:
+            self._trace.close()
+        
+        self._trace = None
+        self._trace_writer = None
+    
+    # Overlay
+    def draw(self, surface: "pygame.Surface", labels: "LabelRenderer", position: tuple[int, int] = (10, 40)):
+        # Returns the rectangles drawn over
+        x, y = position
+        percentiles = self.percentiles()
+        
+        lines = [f"{'ms':<10}" + "".join(f"{f'p{p:g}':>7}" for p in PROFILE_PERCENTILES)]
+        lines += [f"{name:<10}" + "".join(f"{value * 1000:7.2f}" for value in values) for name, values in percentiles.items()]
+        
+        return surface.blits([(labels.render(line), (x, y + i * labels.font.get_linesize())) for i, line in enumerate(lines)])
+
+class _NullProfiler:
+    # Stands in for a profiler so instrumented code never has to check whether one is attached
+    def stage(self, name: str):
+        return nullcontext()
+    
+    def record(self, name: str, seconds: float):
+        pass
+    
+    def end_frame(self):
+        pass
+
+NULL_PROFILER = _NullProfiler()
@@ -0,0 +1,154 @@
+import numpy as np
+import pygame
+
+from culling import CLIPPED_NEAR_PLANE
+
+BATCH_PIXELS = 1 << 21
+
+
+class Rasterizer:
+    # Depth is kept as 1 / z, which interpolates linearly in screen space, so bigger means nearer and 0 means empty
+    def __init__(self):
+        self.depth = np.zeros((0, 0), dtype=np.float32)
+    
+    def begin(self, surface: pygame.Surface):
+        if self.depth.shape != surface.get_size():
+            self.depth = np.zeros(surface.get_size(), dtype=np.float32)
+        else:
+            self.depth.fill(0)
+    
+    def draw_triangles(self, surface: pygame.Surface, points: np.ndarray, depth: np.ndarray, triangles: np.ndarray, colours: np.ndarray):
+        width, height = surface.get_size()
+        
+        (x0, x1, x2), (y0, y1, y2) = points[triangles].transpose(2, 1, 0)
+        triangle_depth = depth[triangles]
+        
+        # Bounding boxes of the pixel centres (pixel + 0.5) each triangle can cover
+        x_min = np.maximum(np.ceil(np.minimum(np.minimum(x0, x1), x2) - 0.5), 0).astype(np.int64)
+        x_max = np.minimum(np.floor(np.maximum(np.maximum(x0, x1), x2) - 0.5), width - 1).astype(np.int64)
+        y_min = np.maximum(np.ceil(np.minimum(np.minimum(y0, y1), y2) - 0.5), 0).astype(np.int64)
+        y_max = np.minimum(np.floor(np.maximum(np.maximum(y0, y1), y2) - 0.5), height - 1).astype(np.int64)
+        
+        area = (x1 - x0) * (y2 - y0) - (x2 - x0) * (y1 - y0)
+        
+        # Triangles are expected to be cut at the near plane already (see clip_triangles), anything still behind it is left out
+        visible = np.flatnonzero((triangle_depth.min(axis=1) > CLIPPED_NEAR_PLANE) & (area != 0) & (x_max >= x_min) & (y_max >= y_min))
+        
+        if not len(visible):
+            return
+        
+        x0, x1, x2, y0, y1, y2 = (array[visible] for array in (x0, x1, x2, y0, y1, y2))
+        inverse_area = 1 / area[visible]
+        
+        # Barycentric weights and 1 / z are affine in screen space: value = a * x + b * y + c for every triangle
+        w0 = ((y1 - y2) * inverse_area, (x2 - x1) * inverse_area, (x1 * y2 - x2 * y1) * inverse_area)
+        w1 = ((y2 - y0) * inverse_area, (x0 - x2) * inverse_area, (x2 * y0 - x0 * y2) * inverse_area)
+        w2 = (-w0[0] - w1[0], -w0[1] - w1[1], 1 - w0[2] - w1[2])
+        
+        d0, d1, d2 = (1 / triangle_depth[visible]).T
+        inverse_depth = tuple(a * d0 + b * d1 + c * d2 for a, b, c in zip(w0, w1, w2))
+        
+        coefficients = np.column_stack((*w0, *w1, *w2, *inverse_depth)).astype(np.float32)
+        
+        box_widths = x_max[visible] - x_min[visible] + 1
+        counts = box_widths * (y_max[visible] - y_min[visible] + 1)
+        
+        pixels = pygame.surfarray.pixels3d(surface)
+        
+        for batch in _batches(counts):
+            self._rasterize(
+                pixels, coefficients[batch], colours[visible[batch]],
+                x_min[visible[batch]], y_min[visible[batch]], box_widths[batch], counts[batch],
+            )
+        
+        del pixels
+    
+    def draw_lines(self, surface: pygame.Surface, starts: np.ndarray, ends: np.ndarray, colour: str | tuple[int, int, int]):
+        # One pixel wide segments, already clipped to the surface, plotted with a vectorized DDA
+        width, height = surface.get_size()
+        colour = np.array(pygame.Color(colour)[:3], dtype=np.uint8)
+        
+        steps = np.ceil(np.abs(ends - starts).max(axis=1)).astype(np.int64) + 1
+        
+        pixels = pygame.surfarray.pixels3d(surface)
+        
+        for batch in _batches(steps):
+            batch_steps = steps[batch]
+            
+            owner = np.repeat(np.arange(len(batch_steps)), batch_steps)
+            local = np.arange(batch_steps.sum()) - np.repeat(np.cumsum(batch_steps) - batch_steps, batch_steps)
+            
+            t = local / np.maximum(batch_steps - 1, 1)[owner]
+            start, delta = starts[batch][owner], (ends[batch] - starts[batch])[owner]
+            
+            px = np.clip(np.rint(start[:, 0] + t * delta[:, 0]), 0, width - 1).astype(np.int64)
+            py = np.clip(np.rint(start[:, 1] + t * delta[:, 1]), 0, height - 1).astype(np.int64)
+            
+            pixels[px, py] = colour
+        
+        del pixels
+    
+    def draw_points(self, surface: pygame.Surface, points: np.ndarray, size: int, colour: str | tuple[int, int, int]):
+        # Filled squares size pixels wide centred on the points, cut to the surface
+        width, height = surface.get_size()
+        colour = np.array(pygame.Color(colour)[:3], dtype=np.uint8)
+        
+        corners = np.floor(points - size / 2).astype(np.int64)
+        offsets = np.arange(size)
+        
+        pixels = pygame.surfarray.pixels3d(surface)
+        
+        for batch in _batches(np.full(len(corners), size * size)):
+            px, py = np.broadcast_arrays(corners[batch, 0, None, None] + offsets[:, None], corners[batch, 1, None, None] + offsets)
+            inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+            
+            pixels[px[inside], py[inside]] = colour
+        
+        del pixels
+    
+    def _rasterize(self, pixels, coefficients, colours, x_min, y_min, box_widths, counts):
+        owner = np.repeat(np.arange(len(counts)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        
+        px = x_min[owner] + local % box_widths[owner]
+        py = y_min[owner] + local // box_widths[owner]
+        
+        cx = px.astype(np.float32) + 0.5
+        cy = py.astype(np.float32) + 0.5
+        
+        c = coefficients[owner].T
+        
+        inside = (c[0] * cx + c[1] * cy + c[2] >= 0) & (c[3] * cx + c[4] * cy + c[5] >= 0) & (c[6] * cx + c[7] * cy + c[8] >= 0)
+        
+        px, py, owner, cx, cy = px[inside], py[inside], owner[inside], cx[inside], cy[inside]
+        fragment_depth = c[9][inside] * cx + c[10][inside] * cy + c[11][inside]
+        
+        # Depth test: keep the nearest fragment of every pixel, across batches too
+        depth = self.depth.reshape(-1)
+        pixel_ids = px * self.depth.shape[1] + py
+        
+        np.maximum.at(depth, pixel_ids, fragment_depth)
+        
+        nearest = fragment_depth == depth[pixel_ids]
+        pixels[px[nearest], py[nearest]] = colours[owner[nearest]]
+
+def _batches(counts: np.ndarray):
+    # Slices of consecutive primitives whose generated pixels stay under BATCH_PIXELS (at least one primitive each)
+    totals = np.cumsum(counts)
+    start = 0
+    
+    while start < len(counts):
+        end = max(int(np.searchsorted(totals, totals[start] - counts[start] + BATCH_PIXELS, side="right")), start + 1)
+        
+        yield slice(start, end)
+        
+        start = end
+
+def flat_shade(normals: np.ndarray, colour: tuple[int, int, int], light_direction: np.ndarray, ambient: float):
+    lengths = np.linalg.norm(normals, axis=1)
+    lengths[lengths == 0] = 1
+    
+    # Two-sided lighting, faces are lit the same from either side
+    intensity = ambient + (1 - ambient) * np.abs(normals @ light_direction) / lengths
+    
+    return (np.array(colour, dtype=np.float32) * intensity[:, None].astype(np.float32)).astype(np.uint8)
@@ -0,0 +1,169 @@
+import weakref
+from typing import Callable
+
+import numpy as np
+import pygame
+
+from constants import *
+from point_data import Vec3
+from raster import Rasterizer
+from culling import boxes_outside_frustum
+from models import BaseModel
+
+
+class BoundingVolumeHierarchy:
+    # Binary tree over axis aligned boxes, split at the median of the widest axis. The topology only changes
+    # on build, moving items just refit the boxes, one numpy pass per tree level
+    def __init__(self, low: np.ndarray, high: np.ndarray):
+        self.build(low, high)
+    
+    def build(self, low: np.ndarray, high: np.ndarray):
+        centres = (low + high) / 2
+        left, right, item, depth = [], [], [], []
+        
+        def add(items: np.ndarray, level: int):
+            node = len(item)
+            left.append(-1)
+            right.append(-1)
+            item.append(-1)
+            depth.append(level)
+            
+            if len(items) == 1:
+                item[node] = items[0]
+            else:
+                axis = np.ptp(centres[items], axis=0).argmax()
+                items = items[np.argsort(centres[items, axis], kind="stable")]
+                
+                left[node] = add(items[:len(items) // 2], level + 1)
+                right[node] = add(items[len(items) // 2:], level + 1)
+            
+            return node
+        
+        if len(low):
+            add(np.arange(len(low)), 0)
+        
+        self.left = np.array(left, dtype=np.intp)
+        self.right = np.array(right, dtype=np.intp)
+        self.item = np.array(item, dtype=np.intp)
+        
+        depth = np.array(depth, dtype=np.intp)
+        internal = self.item < 0
+        # Deepest level first so children are always fitted before their parents
+        self._levels = [np.flatnonzero(internal & (depth == level)) for level in range(depth.max(initial=0), -1, -1)]
+        
+        self.refit(low, high)
+    
+    def refit(self, low: np.ndarray, high: np.ndarray):
+        leaves = np.flatnonzero(self.item >= 0)
+        
+        self.low = np.empty((len(self.item), 3))
+        self.high = np.empty((len(self.item), 3))
+        self.low[leaves] = low[self.item[leaves]]
+        self.high[leaves] = high[self.item[leaves]]
+        
+        for nodes in self._levels:
+            self.low[nodes] = np.minimum(self.low[self.left[nodes]], self.low[self.right[nodes]])
+            self.high[nodes] = np.maximum(self.high[self.left[nodes]], self.high[self.right[nodes]])
+    
+    def query(self, outside):
+        # Items whose boxes are not rejected by outside(low, high), whole subtrees are rejected at once
+        found = [np.empty(0, dtype=np.intp)]
+        frontier = np.zeros(min(len(self.item), 1), dtype=np.intp)
+        
+        while len(frontier):
+            frontier = frontier[~outside(self.low[frontier], self.high[frontier])]
+            
+            leaves = self.item[frontier] >= 0
+            found.append(self.item[frontier[leaves]])
+            
+            frontier = np.concatenate((self.left[frontier[~leaves]], self.right[frontier[~leaves]]))
+        
+        return np.sort(np.concatenate(found))
+
+class Scene:
+    # Many models drawn in one pass: models whose bounds are off-screen are skipped before any of their
+    # vertices are transformed, and every model shares one rasterizer so faces are depth tested against each other
+    def __init__(self, screen: pygame.Surface):
+        self.screen = screen
+        self.models: list[BaseModel] = []
+        
+        self.rasterizer = Rasterizer()
+        self._hierarchy: BoundingVolumeHierarchy | None = None
+        # Packed copies of the unpacked data instanced so far, each dropped once its source is collected
+        self._packed: dict[int, PackedModelData] = {}
+    
+    def add(self, model: BaseModel):
+        model.rasterizer = self.rasterizer
+        model.clear_depth = False
+        
+        self.models.append(model)
+        self._hierarchy = None
+        
+        return model
+    
+    def instance(self, data: ModelData | PackedModelData, origin: Vec3 | None = None, factory: Callable[[PackedModelData, Vec3], BaseModel] | None = None):
+        # Every instance of the same data draws from the same vertex buffer, unpacked data is packed only once.
+        # factory(data, origin) makes the model, a BaseModel on this scene's screen by default
+        if not isinstance(data, PackedModelData):
+            packed = self._packed.get(id(data))
+            
+            if packed is None:
+                packed = self._packed[id(data)] = PackedModelData.pack(data)
+                weakref.finalize(data, self._packed.pop, id(data), None)
+            
+            data = packed
+        
+        origin = Vec3(0, 0, 1) if origin is None else origin
+        model = BaseModel(self.screen, data, origin) if factory is None else factory(data, origin)
+        
+        return self.add(model)
+    
+    def remove(self, model: BaseModel):
+        self.models.remove(model)
+        self._hierarchy = None
+        
+        model.rasterizer = Rasterizer()
+        model.clear_depth = True
+    
+    def rebuild(self):
+        # Refitting keeps the tree correct as models move, rebuilding keeps it tight
+        self._hierarchy = None
+    
+    def visible_models(self):
+        if not self.models:
+            return []
+        
+        bounds = [model.world_bounds() for model in self.models]
+        low = np.array([low for low, _ in bounds])
+        high = np.array([high for _, high in bounds])
+        
+        if self._hierarchy is None:
+            self._hierarchy = BoundingVolumeHierarchy(low, high)
+        else:
+            self._hierarchy.refit(low, high)
+        
+        # Points are drawn a few pixels around their vertex
+        margin = 2 * POINT_SIZE / min(self.screen.get_size())
+        visible = self._hierarchy.query(lambda low, high: boxes_outside_frustum(low, high, margin))
+        
+        return [self.models[i] for i in visible.tolist()]
+    
+    def draw(self, display_flag: int):
+        self.rasterizer.begin(self.screen)
+        
+        for model in self.visible_models():
+            model.draw(display_flag)
+    
+    def step(self, dt: float, *args, **kwargs):
+        for model in self.models:
+            model.step(dt, *args, **kwargs)
+    
+    def interpolate(self, alpha: float):
+        for model in self.models:
+            model.interpolate(alpha)
+    
+    def run(self, display_flag: int, dt: float = 1 / SIMULATION_RATE, *args, **kwargs):
+        # One step of dt seconds for every model, drawn at the poses it ends on
+        self.step(dt, *args, **kwargs)
+        self.interpolate(1.0)
+        self.draw(display_flag)
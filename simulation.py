@@ -0,0 +1,31 @@
+from constants import SIMULATION_RATE, MAX_FRAME_TIME
+
+
+class SimulationClock:
+    # Real time is banked and spent in whole fixed steps, so the simulation advances the same way however
+    # fast frames are drawn. What is left over is how far the next frame sits between the last two steps
+    def __init__(self, step: float = 1 / SIMULATION_RATE, max_frame_time: float = MAX_FRAME_TIME):
+        self.step = step
+        self.max_frame_time = max_frame_time
+        
+        self.time = 0.0
+        self.steps = 0
+        
+        self._accumulator = 0.0
+    
+    def advance(self, elapsed: float):
+        # Number of steps to run for `elapsed` seconds of real time. A stalled frame is cut short so the
+        # steps it owes can never pile up faster than they are run
+        self._accumulator += min(elapsed, self.max_frame_time)
+        
+        steps = int(self._accumulator // self.step)
+        self._accumulator -= steps * self.step
+        
+        self.time += steps * self.step
+        self.steps += steps
+        
+        return steps
+    
+    @property
+    def alpha(self):
+        return self._accumulator / self.step
@@ -0,0 +1,61 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+from constants import *
+from models import BaseModel
+from point_data import Vec3
+from raster import Rasterizer
+
+# Found by search, cutting it at the near plane puts a new corner a rounding error behind the plane
+CROSSING_TRIANGLE = np.array([
+    [-0.06608707, -0.1986251, 0.99604005],
+    [0.12399144, 0.00755847, -0.00142994],
+    [-0.24712029, -0.05724376, -0.4083437],
+], dtype=np.float32)
+
+
+def filled_pixels(surface: pygame.Surface):
+    return int((pygame.surfarray.pixels3d(surface).sum(axis=2) > 0).sum())
+
+def crossing_model(surface: pygame.Surface):
+    data = PackedModelData(CROSSING_TRIANGLE, np.array([0, 1, 2], dtype=np.int32), np.array([0, 3]))
+    model = BaseModel(surface, data, Vec3(0, 0, 0))
+    model.backface_culling = False
+    
+    return model
+
+def test_corner_on_near_plane_is_drawn():
+    surface = pygame.Surface((40, 40))
+    rasterizer = Rasterizer()
+    rasterizer.begin(surface)
+    
+    points = np.array([[5, 5], [35, 5], [5, 35]], dtype=np.float64)
+    depth = np.array([1, np.nextafter(NEAR_PLANE, 0), 1])
+    rasterizer.draw_triangles(surface, points, depth, np.array([[0, 1, 2]]), np.array([[255, 255, 255]]))
+    
+    assert filled_pixels(surface) > 0
+
+def test_triangle_crossing_near_plane_is_drawn():
+    pygame.display.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    model = crossing_model(screen)
+    
+    screen.fill("black")
+    model.draw(DisplayFlags.FACE.value)
+    
+    assert filled_pixels(screen) > 0
+
+def test_triangle_crossing_near_plane_is_picked():
+    pygame.display.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    model = crossing_model(screen)
+    
+    screen.fill("black")
+    model.draw(DisplayFlags.FACE.value)
+    
+    x, y = np.argwhere(pygame.surfarray.pixels3d(screen).sum(axis=2) > 0)[0]
+    assert model.pick_face(x, y) == 0
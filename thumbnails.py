@@ -0,0 +1,113 @@
+import argparse
+import dataclasses
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Render farm nodes have no display, every surface here is offscreen
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+from constants import *
+from parser import parse_model
+from point_data import Vec3, AngleVec3
+from models import BaseModel
+
+# Distance of the camera from a model fitted into the unit sphere, leaves a margin around it in the 90 degree view
+VIEW_DISTANCE = 2
+
+
+def _fit_unit_sphere(data: PackedModelData):
+    # Centred on its bounding box and scaled to radius 1 so every model fills a thumbnail the same way
+    if not len(data.v):
+        return data
+    
+    vertices = data.v - (data.v.min(axis=0) + data.v.max(axis=0)) / 2
+    radius = np.linalg.norm(vertices, axis=1).max()
+    
+    return dataclasses.replace(data, v=vertices / (radius if radius > 0 else 1))
+
+def thumbnail_path(output: str, model_path: str, angle: tuple[float, float, float]):
+    # The extension stays in the name so a.ply and a.stl get their own thumbnails
+    name, extension = os.path.splitext(os.path.basename(model_path))
+    if extension:
+        name = f"{name}_{extension[1:]}"
+    
+    return os.path.join(output, f"{name}_{'_'.join(f'{a:g}' for a in angle)}.png")
+
+def render_thumbnails(model_path: str, angles: list[tuple[float, float, float]], display_flag: int, size: int, output: str):
+    # The model is parsed once and drawn from every angle, returns the written paths
+    surface = pygame.Surface((size, size))
+    model = BaseModel(surface, _fit_unit_sphere(parse_model(model_path)), Vec3(0, 0, VIEW_DISTANCE))
+    
+    paths = []
+    for angle in angles:
+        model.angle = AngleVec3(*angle)
+        
+        surface.fill("black")
+        model.draw(display_flag)
+        
+        paths.append(thumbnail_path(output, model_path, angle))
+        pygame.image.save(surface, paths[-1])
+    
+    return paths
+
+def _angle(text: str):
+    angle = tuple(float(a) for a in text.split(","))
+    
+    if len(angle) != 3:
+        raise argparse.ArgumentTypeError(f"expected xy,xz,yz but got '{text}'")
+    
+    return angle
+
+def render_all(model_paths: list[str], angles: list[tuple[float, float, float]], display_flag: int, size: int, output: str, workers: int):
+    # Returns how many models failed. Files that would write the same thumbnails are refused before anything is drawn
+    model_paths = list(dict.fromkeys(os.path.abspath(path) for path in model_paths))
+    
+    names = {}
+    for path in model_paths:
+        name = thumbnail_path(output, path, (0, 0, 0))
+        if name in names:
+            raise ValueError(f"{names[name]} and {path} would both be saved as {name}")
+        names[name] = path
+    
+    os.makedirs(output, exist_ok=True)
+    failures = 0
+    
+    with ProcessPoolExecutor(workers) as executor:
+        jobs = {executor.submit(render_thumbnails, path, angles, display_flag, size, output): path for path in model_paths}
+        
+        for job in as_completed(jobs):
+            try:
+                for path in job.result():
+                    print(path)
+            except Exception as error:
+                print(f"{jobs[job]}: {error}", file=sys.stderr)
+                failures += 1
+    
+    return failures
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Render OBJ, PLY and STL files to PNG thumbnails without a display")
+    argparser.add_argument("models", nargs="+")
+    argparser.add_argument("--angles", nargs="+", type=_angle, default=[(0, 0, 0)], help="xy,xz,yz rotations in degrees, one thumbnail each")
+    argparser.add_argument("--flags", nargs="+", choices=[flag.name for flag in DisplayFlags], default=["FACE"])
+    argparser.add_argument("--size", type=int, default=256)
+    argparser.add_argument("--output", default="thumbnails")
+    argparser.add_argument("--workers", type=int, default=os.cpu_count())
+    
+    args = argparser.parse_args()
+    
+    display_flag = 0
+    for flag in args.flags:
+        display_flag |= DisplayFlags[flag].value
+    
+    try:
+        failures = render_all(args.models, args.angles, display_flag, args.size, args.output, args.workers)
+    except ValueError as error:
+        argparser.error(str(error))
+    
+    sys.exit(1 if failures else 0)